@@ -1,21 +1,47 @@
+import hashlib
 import ipaddress
-import json
 import logging
 import os
 import socket
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Union, cast
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 
+import dns.exception
+import dns.resolver
 import maxminddb
+import orjson
 import requests
 import whois
-from apscheduler.schedulers.background import BackgroundScheduler
-from flask import Flask, jsonify, request
+from cachetools import LRUCache, TTLCache
+from flask import Flask, make_response, request
+from flask.json.provider import JSONProvider
 from flask_restx import Api, Namespace, Resource, fields
 from ipwhois import IPWhois
+from requests.adapters import HTTPAdapter
 from rich.logging import RichHandler
-from rich.progress import Progress
+from rich.progress import Progress, TaskID
+from urllib3.util.retry import Retry
 from waitress import serve
+from werkzeug.http import quote_etag
 
 
 # --- Configuration ---
@@ -40,6 +66,28 @@ class Config:
     )
     ENABLE_API_DOCS = os.environ.get("GUNTER_ENABLE_API_DOCS", "true").lower() == "true"
     CORS_ORIGINS = os.environ.get("GUNTER_CORS_ORIGINS")
+    DOWNLOAD_CHUNK_SIZE = int(
+        os.environ.get("GUNTER_DOWNLOAD_CHUNK_SIZE", str(1024 * 1024))
+    )
+    WHOIS_CACHE_SIZE = int(os.environ.get("GUNTER_WHOIS_CACHE_SIZE", "50000"))
+    WHOIS_CACHE_TTL = int(os.environ.get("GUNTER_WHOIS_CACHE_TTL", "86400"))
+    WHOIS_STALE_TTL = int(os.environ.get("GUNTER_WHOIS_STALE_TTL", "86400"))
+    RDNS_CACHE_TTL = int(os.environ.get("GUNTER_RDNS_CACHE_TTL", "3600"))
+    RDNS_NEGATIVE_CACHE_TTL = int(
+        os.environ.get("GUNTER_RDNS_NEGATIVE_CACHE_TTL", "300")
+    )
+    RDNS_TIMEOUT = float(os.environ.get("GUNTER_RDNS_TIMEOUT", "1.0"))
+    CACHE_MAX_AGE = int(os.environ.get("GUNTER_CACHE_MAX_AGE", "3600"))
+    WHOIS_TIMEOUT = float(os.environ.get("GUNTER_WHOIS_TIMEOUT", "2.0"))
+    WHOIS_WORKERS = int(os.environ.get("GUNTER_WHOIS_WORKERS", "32"))
+    PREWARM_LOOKUPS = int(os.environ.get("GUNTER_PREWARM_LOOKUPS", "10000"))
+    THREADS = int(os.environ.get("GUNTER_THREADS", "8"))
+    MAX_BATCH_IPS = int(os.environ.get("GUNTER_MAX_BATCH_IPS", "100"))
+
+
+_DEFAULT_LANG = Config.DEFAULT_LANG.lower()
+# Query parameter values accepted as true
+_TRUTHY = frozenset({"true", "1", "yes", "on"})
 
 
 # --- Logging Setup ---
@@ -52,6 +100,121 @@ logging.basicConfig(
 log = logging.getLogger("rich")
 
 
+def _is_valid_ip(ip: str) -> int:
+    """Returns the address family of an IPv4/IPv6 address string, or 0 if invalid."""
+    # IPv6 addresses always contain ':' and IPv4 addresses start with a digit,
+    # so domain names are rejected without raising from inet_pton
+    if ":" in ip:
+        family = socket.AF_INET6
+    elif ip[:1].isdigit():
+        family = socket.AF_INET
+    else:
+        return 0
+    try:
+        socket.inet_pton(family, ip)
+        return family
+    except (OSError, ValueError):
+        # inet_pton raises ValueError for strings with an embedded NUL
+        return 0
+
+
+@lru_cache(maxsize=4096)
+def _is_non_public_ip(ip: str) -> bool:
+    """Returns True for private, loopback, link-local, reserved or multicast IPs."""
+    # ipaddress parsing is ~15x slower than inet_pton; repeated targets are common
+    addr = ipaddress.ip_address(ip)
+    return (
+        addr.is_private
+        or addr.is_loopback
+        or addr.is_link_local
+        or addr.is_reserved
+        or addr.is_multicast
+    )
+
+
+class ReadWriteLock:
+    """
+    Lets any number of readers hold the lock at once, or a single writer.
+    Waiting writers block new readers so that a swap cannot be starved.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writing = False
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+# (second, formatted timestamp) of the last _utc_timestamp call
+_utc_timestamp_cache: Tuple[int, str] = (0, "")
+
+
+def _utc_timestamp() -> str:
+    """Returns the current UTC time as an ISO 8601 string with seconds precision."""
+    global _utc_timestamp_cache
+    now = int(time.time())
+    second, formatted = _utc_timestamp_cache
+    if second != now:
+        # Formatted at most once per second; a race only formats it twice
+        formatted = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        _utc_timestamp_cache = (now, formatted)
+    return formatted
+
+
+class HashingReader:
+    """
+    Wraps a binary file object, feeding everything read through it into a
+    SHA-256 hash and optionally advancing a progress bar task.
+    """
+
+    def __init__(
+        self,
+        raw: Any,
+        progress: Optional[Progress] = None,
+        task: Optional[TaskID] = None,
+    ):
+        self._raw = raw
+        self._progress = progress
+        self._task = task
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data: bytes = self._raw.read(size)
+        self.sha256.update(data)
+        if self._progress is not None and self._task is not None:
+            self._progress.update(self._task, advance=len(data))
+        return data
+
+
 # --- Service classes for encapsulated logic ---
 class GeoDBManager:
     """Manages the lifecycle of the GeoLite2 database."""
@@ -60,41 +223,190 @@ class GeoDBManager:
         self.config = config
         self.mmdb_reader: Optional[maxminddb.Reader] = None
         self.last_db_update_time: Optional[datetime] = None
+        self._last_db_update_iso: Tuple[Optional[datetime], str] = (None, "N/A")
         self.current_db_version_tag: str = "N/A"
         self.current_db_file_path: Optional[str] = None
+        # Lookups hold the read side, swapping the reader takes the write side
+        self._reader_lock = ReadWriteLock()
+        # Serializes database downloads and reloads
+        self._update_lock = threading.Lock()
+        # Bumped on every swap, so cached lookups never outlive their reader
+        self.reader_generation = 0
+        # Validators of the last external download, for conditional requests
+        self._external_etag: Optional[str] = None
+        self._external_last_modified: Optional[str] = None
+        self._maxmind_last_modified: Optional[str] = None
+        # One pooled session for all downloads, retrying transient gateway errors
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            max_retries=Retry(
+                total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]
+            )
+        )
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.http.headers["User-Agent"] = "Gunter"
+
+    def last_db_update_iso(self) -> str:
+        """Returns last_db_update_time in ISO format, formatting it once per update."""
+        update_time = self.last_db_update_time
+        cached = self._last_db_update_iso
+        if cached[0] is not update_time:
+            cached = (
+                update_time,
+                update_time.isoformat() if update_time else "N/A",
+            )
+            self._last_db_update_iso = cached
+        return cached[1]
 
     def _cleanup_old_db_files(self, new_db_filepath: str):
         """Removes old, unused DB files."""
-        if (
-            self.current_db_file_path
-            and self.current_db_file_path != new_db_filepath
-            and os.path.exists(self.current_db_file_path)
-        ):
-            try:
-                os.remove(self.current_db_file_path)
-                log.info(
-                    f"Successfully removed old database file: {self.current_db_file_path}"
-                )
-            except OSError as e:
-                log.error(
-                    f"Error deleting old database file {self.current_db_file_path}: {e}"
-                )
+        old_db_filepath = self.current_db_file_path
+        if not old_db_filepath or old_db_filepath == new_db_filepath:
+            return
+        try:
+            os.unlink(old_db_filepath)
+            log.info("Successfully removed old database file: %s", old_db_filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.error("Error deleting old database file %s: %s", old_db_filepath, e)
 
     def _cleanup_failed_download(self, filepath: str):
         """Removes a partially downloaded or invalid file."""
-        if os.path.exists(filepath):
+        try:
+            os.unlink(filepath)
+            log.info("Removed corrupt or incomplete database file: %s", filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.error("Error removing corrupt file %s: %s", filepath, e)
+
+    def _cleanup_partial_downloads(self):
+        """Removes '.tmp' downloads left behind by a process that was killed."""
+        try:
+            names = os.listdir(self.config.DB_DIR)
+        except OSError as e:
+            log.error("Error listing %s: %s", self.config.DB_DIR, e)
+            return
+        for name in names:
+            if name.endswith(".tmp") and name.startswith(
+                ("external-", "GeoLite2-City-")
+            ):
+                self._cleanup_failed_download(os.path.join(self.config.DB_DIR, name))
+
+    def _swap_reader(self, new_reader: Optional[maxminddb.Reader]):
+        """Replaces the active reader once no lookup is using it and closes the old one."""
+        with self._reader_lock.write():
+            old_reader, self.mmdb_reader = self.mmdb_reader, new_reader
+            self.reader_generation += 1
+            _cached_lookup.cache_clear()
+            with _network_cache_lock:
+                _network_cache.clear()
+        if old_reader:
+            old_reader.close()
+
+    def _advise_page_cache(self, db_path: str):
+        """Asks the kernel to read the database into the page cache ahead of lookups."""
+        if not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            fd = os.open(db_path, os.O_RDONLY)
             try:
-                os.remove(filepath)
-                log.info(f"Removed corrupt or incomplete database file: {filepath}")
-            except OSError as e:
-                log.error(f"Error removing corrupt file {filepath}: {e}")
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            log.debug("posix_fadvise on %s failed: %s", db_path, e)
+
+    def _prewarm(self, reader: Any):
+        """
+        Looks up addresses spread evenly over the IPv4 space so the pages of the
+        search tree are faulted in before real requests need them. Runs on the
+        new reader before it is swapped in, on the calling thread: a background
+        thread holding the reader lock could be caught mid-lookup by gunicorn's
+        fork, leaving workers with a lock nobody will release.
+        """
+        count = self.config.PREWARM_LOOKUPS
+        if count <= 0:
+            return
+        step = 2**32 // count
+        started = time.monotonic()
+        for seed in range(count):
+            reader.get_with_prefix_len(str(ipaddress.IPv4Address(seed * step)))
+        log.info(
+            "Prewarmed database with %d lookups in %.2fs.",
+            count,
+            time.monotonic() - started,
+        )
+
+    def _keep_current_reader(self):
+        """Called after a failed load; the previous database stays active."""
+        if self.mmdb_reader:
+            log.warning(
+                "Keeping the previously loaded database %s.", self.current_db_file_path
+            )
+
+    def _activate_reader(self, db_path: str):
+        """Opens the database at db_path and makes it the active reader."""
+        try:
+            new_reader = maxminddb.open_database(db_path, maxminddb.MODE_MMAP_EXT)
+            mode = "MODE_MMAP_EXT"
+        except ValueError as e:
+            log.warning(
+                "maxminddb C extension unavailable (%s), falling back to the "
+                "pure Python mmap reader. Lookups will be significantly slower.",
+                e,
+            )
+            new_reader = maxminddb.open_database(db_path, maxminddb.MODE_MMAP)
+            mode = "MODE_MMAP"
+        try:
+            # Probe the new database before it replaces a working one
+            new_reader.get("8.8.8.8")
+        except Exception:
+            new_reader.close()
+            raise
+        self._advise_page_cache(db_path)
+        self._prewarm(new_reader)
+        self._swap_reader(new_reader)
+        metadata = new_reader.metadata()
+        log.info(
+            "Opened %s database (build epoch %s) from %s in %s.",
+            metadata.database_type,
+            metadata.build_epoch,
+            db_path,
+            mode,
+        )
+
+    def lookup(self, ip: str) -> Tuple[Any, int]:
+        """
+        Looks up an IP address in the active database. Returns the record
+        (None if not found or no database is loaded) and the prefix length of
+        the network it was found in.
+        """
+        with self._reader_lock.read():
+            if self.mmdb_reader is None:
+                return None, 0
+            return self.mmdb_reader.get_with_prefix_len(ip)
 
     def download_and_load_database(self):
         """Downloads and loads the MMDB database from an external URL, local file, or GeoLite2. Cleans up old versions."""
+        # Overlapping updates would race on the same files and download the
+        # database twice, so a call made while one is running is skipped
+        if not self._update_lock.acquire(blocking=False):
+            log.info("Database update already in progress, skipping.")
+            return
+        try:
+            self._download_and_load_database()
+        finally:
+            self._update_lock.release()
+
+    def _download_and_load_database(self):
         import shutil
         from urllib.parse import urlparse
 
         os.makedirs(self.config.DB_DIR, exist_ok=True)
+        self._cleanup_partial_downloads()
 
         # 1. External DB URL (http(s), ftp(s))
         if self.config.EXTERNAL_DB_URL:
@@ -104,7 +416,12 @@ class GeoDBManager:
             ext = os.path.splitext(parsed.path)[-1] or ".mmdb"
             new_db_filename = f"external-{timestamp}{ext}"
             new_db_filepath = os.path.join(self.config.DB_DIR, new_db_filename)
-            log.info(f"Downloading MMDB from external source: {url}")
+            # Written under a temporary name and renamed once complete, so the
+            # final path never holds a partial download
+            partial_filepath = new_db_filepath + ".tmp"
+            log.info("Downloading MMDB from external source: %s", url)
+            etag: Optional[str] = None
+            last_modified: Optional[str] = None
             try:
                 if parsed.scheme.startswith("ftp"):
                     import ftplib
@@ -120,48 +437,73 @@ class GeoDBManager:
                     ) as ftp:
                         ftp.connect(ftp_host, ftp_port, timeout=30)
                         ftp.login(ftp_user, ftp_pass)
-                        with open(new_db_filepath, "wb") as f:
+                        with open(partial_filepath, "wb") as f:
                             ftp.retrbinary(f"RETR {ftp_path}", f.write)
                 else:
-                    response = requests.get(url, stream=True, timeout=60)
-                    response.raise_for_status()
-                    total_size = int(response.headers.get("content-length", 0))
-                    with Progress() as progress:
-                        task = progress.add_task(
-                            f"[cyan]Downloading MMDB from {url}...", total=total_size
-                        )
-                        with open(new_db_filepath, "wb") as f:
-                            for chunk in response.iter_content(chunk_size=8192):
-                                f.write(chunk)
-                                progress.update(task, advance=len(chunk))
-                log.info(f"Successfully downloaded external MMDB: {new_db_filepath}")
-                if self.mmdb_reader:
-                    self.mmdb_reader.close()
-                self.mmdb_reader = maxminddb.open_database(new_db_filepath)
+                    headers = {}
+                    if self.mmdb_reader:
+                        if self._external_etag:
+                            headers["If-None-Match"] = self._external_etag
+                        if self._external_last_modified:
+                            headers["If-Modified-Since"] = self._external_last_modified
+                    with self.http.get(
+                        url, stream=True, timeout=60, headers=headers
+                    ) as response:
+                        if response.status_code == 304:
+                            log.info(
+                                "External MMDB not modified, keeping current database."
+                            )
+                            return
+                        response.raise_for_status()
+                        etag = response.headers.get("ETag")
+                        last_modified = response.headers.get("Last-Modified")
+                        total_size = int(response.headers.get("content-length", 0))
+                        response.raw.decode_content = True
+                        # A progress bar is only useful on an interactive terminal
+                        show_progress = sys.stdout.isatty()
+                        with Progress(disable=not show_progress) as progress:
+                            task = progress.add_task(
+                                f"[cyan]Downloading MMDB from {url}...",
+                                total=total_size,
+                            )
+                            source = HashingReader(
+                                response.raw, progress if show_progress else None, task
+                            )
+                            with open(partial_filepath, "wb") as f:
+                                shutil.copyfileobj(
+                                    source, f, length=self.config.DOWNLOAD_CHUNK_SIZE
+                                )
+                    log.info(
+                        "SHA-256 of %s: %s", new_db_filepath, source.sha256.hexdigest()
+                    )
+                os.replace(partial_filepath, new_db_filepath)
+                log.info("Successfully downloaded external MMDB: %s", new_db_filepath)
+                self._activate_reader(new_db_filepath)
+                self._external_etag = etag
+                self._external_last_modified = last_modified
                 self.last_db_update_time = datetime.now()
                 self._cleanup_old_db_files(new_db_filepath)
                 self.current_db_file_path = new_db_filepath
-                log.info(f"External MMDB successfully loaded from {new_db_filepath}.")
+                log.info("External MMDB successfully loaded from %s.", new_db_filepath)
             except Exception as e:
-                log.error(f"Failed to download/load external MMDB: {e}")
-                self.mmdb_reader = None
+                log.error("Failed to download/load external MMDB: %s", e)
+                self._keep_current_reader()
+                self._cleanup_failed_download(partial_filepath)
                 self._cleanup_failed_download(new_db_filepath)
             return
 
         # 2. Local custom DB file
         if self.config.CUSTOM_DB_FILE:
             db_path = self.config.CUSTOM_DB_FILE
-            log.info(f"Loading custom MMDB database: {db_path}")
+            log.info("Loading custom MMDB database: %s", db_path)
             try:
-                if self.mmdb_reader:
-                    self.mmdb_reader.close()
-                self.mmdb_reader = maxminddb.open_database(db_path)
+                self._activate_reader(db_path)
                 self.last_db_update_time = datetime.now()
                 self.current_db_file_path = db_path
-                log.info(f"Custom MMDB database successfully loaded from {db_path}.")
+                log.info("Custom MMDB database successfully loaded from %s.", db_path)
             except Exception as e:
-                log.error(f"Failed to load custom MMDB database: {e}")
-                self.mmdb_reader = None
+                log.error("Failed to load custom MMDB database: %s", e)
+                self._keep_current_reader()
             return
 
         # 3. Default: Download GeoLite2 (official MaxMind, requires license key)
@@ -171,53 +513,99 @@ class GeoDBManager:
             log.info(
                 "Attempting to download GeoLite2-City.mmdb from MaxMind (official, license key required)..."
             )
+            if self._maxmind_release_unchanged():
+                log.info("MaxMind database not modified, keeping current database.")
+                return
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            tar_gz_path = os.path.join(
-                self.config.DB_DIR, f"GeoLite2-City-{timestamp}.tar.gz"
+            extracted_path = os.path.join(
+                self.config.DB_DIR, f"GeoLite2-City-{timestamp}.mmdb"
             )
+            partial_path = extracted_path + ".tmp"
+            headers = {}
+            if self.mmdb_reader and self._maxmind_last_modified:
+                headers["If-Modified-Since"] = self._maxmind_last_modified
             try:
-                response = requests.get(
-                    self.config.MAXMIND_DOWNLOAD_URL, stream=True, timeout=120
-                )
-                response.raise_for_status()
-                with open(tar_gz_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                log.info(f"Downloaded GeoLite2-City archive: {tar_gz_path}")
-                with tarfile.open(tar_gz_path, "r:gz") as tar:
-                    mmdb_member = next(
-                        (m for m in tar.getmembers() if m.name.endswith(".mmdb")), None
-                    )
-                    if not mmdb_member:
-                        raise RuntimeError(
-                            "No .mmdb file found in the MaxMind archive!"
+                with self.http.get(
+                    self.config.MAXMIND_DOWNLOAD_URL,
+                    stream=True,
+                    timeout=120,
+                    headers=headers,
+                ) as response:
+                    if response.status_code == 304:
+                        log.info(
+                            "MaxMind database not modified, keeping current database."
                         )
-                    extracted_path = os.path.join(
-                        self.config.DB_DIR, f"GeoLite2-City-{timestamp}.mmdb"
-                    )
-                    with open(extracted_path, "wb") as out_f:
-                        out_f.write(tar.extractfile(mmdb_member).read())
-                log.info(f"Extracted MMDB: {extracted_path}")
-                if self.mmdb_reader:
-                    self.mmdb_reader.close()
-                self.mmdb_reader = maxminddb.open_database(extracted_path)
+                        return
+                    response.raise_for_status()
+                    last_modified = response.headers.get("Last-Modified")
+                    response.raw.decode_content = True
+                    # Extract the .mmdb straight from the download stream, so the
+                    # archive is never written to disk or read into memory.
+                    with tarfile.open(fileobj=response.raw, mode="r|gz") as tar:
+                        for member in tar:
+                            if member.isfile() and member.name.endswith(".mmdb"):
+                                with (
+                                    tar.extractfile(member) as src,
+                                    open(partial_path, "wb") as out_f,
+                                ):
+                                    source = HashingReader(src)
+                                    shutil.copyfileobj(
+                                        source,
+                                        out_f,
+                                        length=self.config.DOWNLOAD_CHUNK_SIZE,
+                                    )
+                                log.info(
+                                    "SHA-256 of %s: %s",
+                                    extracted_path,
+                                    source.sha256.hexdigest(),
+                                )
+                                break
+                        else:
+                            raise RuntimeError(
+                                "No .mmdb file found in the MaxMind archive!"
+                            )
+                os.replace(partial_path, extracted_path)
+                log.info("Extracted MMDB: %s", extracted_path)
+                self._activate_reader(extracted_path)
+                self._maxmind_last_modified = last_modified
                 self.last_db_update_time = datetime.now()
                 self._cleanup_old_db_files(extracted_path)
                 self.current_db_file_path = extracted_path
                 log.info(
-                    f"GeoLite2-City.mmdb successfully loaded from {extracted_path}."
+                    "GeoLite2-City.mmdb successfully loaded from %s.", extracted_path
                 )
             except Exception as e:
                 log.error(
-                    f"Failed to download/extract/load official MaxMind GeoLite2 DB: {e}"
+                    "Failed to download/extract/load official MaxMind GeoLite2 DB: %s",
+                    e,
                 )
-                self.mmdb_reader = None
-                self._cleanup_failed_download(tar_gz_path)
+                self._keep_current_reader()
+                self._cleanup_failed_download(partial_path)
+                self._cleanup_failed_download(extracted_path)
             return
         log.error(
             "No valid MaxMind license key provided. Cannot download GeoLite2-City.mmdb. Please set GUNTER_MAXMIND_LICENSE_KEY."
         )
-        self.mmdb_reader = None
+        self._swap_reader(None)
+
+    def _maxmind_release_unchanged(self) -> bool:
+        """
+        Asks MaxMind with a HEAD request whether the archive changed since the
+        loaded database was downloaded, so an unchanged release is not fetched.
+        """
+        if not (self.mmdb_reader and self._maxmind_last_modified):
+            return False
+        try:
+            response = self.http.head(
+                cast(str, self.config.MAXMIND_DOWNLOAD_URL),
+                timeout=30,
+                allow_redirects=True,
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            log.warning("HEAD request to MaxMind failed, downloading anyway: %s", e)
+            return False
+        return response.headers.get("Last-Modified") == self._maxmind_last_modified
 
     def check_for_new_release_and_update(self):
         """Checks for a new version and updates if necessary.
@@ -244,185 +632,538 @@ class GeoDBManager:
         """Returns the current status of the database."""
         return {
             "database_loaded": self.mmdb_reader is not None,
-            "last_database_update_check_utc": (
-                self.last_db_update_time.isoformat()
-                if self.last_db_update_time
-                else "N/A"
-            ),
+            "last_database_update_check_utc": self.last_db_update_iso(),
             "current_database_version_tag": self.current_db_version_tag,
             "current_database_file": self.current_db_file_path or "N/A",
             "database_directory": self.config.DB_DIR,
         }
 
 
+# Marks a cache miss where None is a valid cached value
+_CACHE_MISS = object()
+
+
 class WhoisService:
     """Provides WHOIS lookups for IPs and domains."""
 
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self._cache_lock = threading.Lock()
+        # Entries are (fetched_at, data) pairs; they stay servable for
+        # WHOIS_STALE_TTL past their freshness while a refresh runs
+        self._ip_whois_cache: TTLCache = TTLCache(
+            maxsize=config.WHOIS_CACHE_SIZE,
+            ttl=config.WHOIS_CACHE_TTL + config.WHOIS_STALE_TTL,
+        )
+        self._ip_whois_fresh_ttl = config.WHOIS_CACHE_TTL
+        self._ip_whois_refreshing: Set[str] = set()
+        # Geo lookups that missed the cache, keyed by target, so concurrent
+        # requests for the same target share one pool task
+        self._whois_in_flight: Dict[str, Future[Dict[str, Any]]] = {}
+        self._domain_whois_cache: TTLCache = TTLCache(
+            maxsize=config.WHOIS_CACHE_SIZE, ttl=config.WHOIS_CACHE_TTL
+        )
+        self._rdns_cache: TTLCache = TTLCache(
+            maxsize=config.WHOIS_CACHE_SIZE, ttl=config.RDNS_CACHE_TTL
+        )
+        self._forward_dns_cache: TTLCache = TTLCache(
+            maxsize=config.WHOIS_CACHE_SIZE, ttl=config.RDNS_CACHE_TTL
+        )
+        # Failed PTR lookups are retried sooner than successful ones are refreshed
+        self._rdns_negative_cache: TTLCache = TTLCache(
+            maxsize=config.WHOIS_CACHE_SIZE, ttl=config.RDNS_NEGATIVE_CACHE_TTL
+        )
+        self._resolver = dns.resolver.Resolver()
+        self._resolver.lifetime = config.RDNS_TIMEOUT
+        self._timeout = config.WHOIS_TIMEOUT
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.WHOIS_WORKERS, thread_name_prefix="whois"
+        )
+        # Separate pool, since WHOIS workers block on these results
+        self._rdns_executor = ThreadPoolExecutor(
+            max_workers=config.WHOIS_WORKERS, thread_name_prefix="rdns"
+        )
+
+    def _cache_get(self, cache: TTLCache, key: str) -> Any:
+        with self._cache_lock:
+            return cache.get(key, _CACHE_MISS)
+
+    def _cache_set(self, cache: TTLCache, key: str, value: Any):
+        with self._cache_lock:
+            cache[key] = value
+
     def _is_ip(self, target: str) -> bool:
-        try:
-            ipaddress.ip_address(target)
-            return True
-        except ValueError:
-            return False
+        return _is_valid_ip(target) != 0
+
+    def _cached_ip_whois(self, ip: str) -> Any:
+        """
+        Returns the cached RDAP data for ip, or _CACHE_MISS. Stale entries are
+        still returned while a background refresh runs.
+        """
+        cached = self._cache_get(self._ip_whois_cache, ip)
+        if cached is _CACHE_MISS:
+            return _CACHE_MISS
+        fetched_at, ip_whois_data = cached
+        if time.monotonic() - fetched_at >= self._ip_whois_fresh_ttl:
+            self._refresh_ip_whois(ip)
+        return ip_whois_data
 
     def _get_ip_whois(self, ip: str) -> Dict[str, Any]:
+        cached = self._cached_ip_whois(ip)
+        if cached is not _CACHE_MISS:
+            return cast(Dict[str, Any], cached)
+        return self._lookup_ip_whois(ip)
+
+    def _refresh_ip_whois(self, ip: str):
+        """Starts a background RDAP lookup for ip unless one is already running."""
+        with self._cache_lock:
+            if ip in self._ip_whois_refreshing:
+                return
+            self._ip_whois_refreshing.add(ip)
+
+        def refresh():
+            try:
+                self._lookup_ip_whois(ip)
+            finally:
+                with self._cache_lock:
+                    self._ip_whois_refreshing.discard(ip)
+
+        self._executor.submit(refresh)
+
+    def _lookup_ip_whois(self, ip: str) -> Dict[str, Any]:
         try:
             ip_whois = IPWhois(ip)
             result = ip_whois.lookup_rdap(depth=1)
-            log.info(f"IP WHOIS lookup for {ip} successful.")
-            return {
+            log.info("IP WHOIS lookup for %s successful.", ip)
+            ip_whois_data = {
                 "asn": result.get("asn"),
                 "asn_description": result.get("asn_description"),
                 "network": result.get("network", {}),
                 "objects": result.get("objects", {}),
             }
+            self._cache_set(self._ip_whois_cache, ip, (time.monotonic(), ip_whois_data))
+            return ip_whois_data
         except Exception as e:
-            log.error(f"IP WHOIS lookup for {ip} failed: {e}")
+            log.error("IP WHOIS lookup for %s failed: %s", ip, e)
             return {"error": f"IP WHOIS lookup failed: {str(e)}"}
 
     def _get_domain_whois(self, domain: str) -> Dict[str, Any]:
+        cached = self._cache_get(self._domain_whois_cache, domain)
+        if cached is not _CACHE_MISS:
+            return cast(Dict[str, Any], cached)
         try:
             domain_info = whois.whois(domain)
-            log.info(f"Domain WHOIS lookup for {domain} successful.")
+            log.info("Domain WHOIS lookup for %s successful.", domain)
             if domain_info:
-                info_dict: Dict[str, Union[str, List[str], Dict[str, Any], None]] = {}
-                for k, v in domain_info.items():
-                    if isinstance(v, datetime):
-                        info_dict[k] = v.isoformat()
-                    elif isinstance(v, list) and v and isinstance(v[0], datetime):
-                        formatted_dates = [item.isoformat() for item in v]
-                        info_dict[k] = formatted_dates
-                    elif v is not None:
-                        info_dict[k] = v
+                # Dates stay datetime objects, orjson writes them as ISO 8601
+                info_dict = {k: v for k, v in domain_info.items() if v is not None}
+                self._cache_set(self._domain_whois_cache, domain, info_dict)
                 return info_dict
             else:
                 return {"error": "No WHOIS data found"}
         except Exception as e:
-            log.error(f"Domain WHOIS lookup for {domain} failed: {e}")
+            log.error("Domain WHOIS lookup for %s failed: %s", domain, e)
             return {"error": f"Domain WHOIS lookup failed: {str(e)}"}
 
     def get_whois_data(self, target: str) -> Dict[str, Any]:
         """Performs a WHOIS lookup for an IP address or domain."""
         data: Dict[str, Any] = {
             "target": target,
-            "lookup_timestamp": datetime.now().isoformat(),
+            "lookup_timestamp": _utc_timestamp(),
         }
         if self._is_ip(target):
+            if _is_non_public_ip(target):
+                # RDAP has nothing useful to say about these ranges and can stall
+                data["ip_whois"] = {"info": "private/reserved, skipped"}
+                data["reverse_dns"] = None
+                return data
+            # The PTR query runs alongside RDAP; it is bounded by the resolver lifetime
+            reverse_dns = self._rdns_executor.submit(self.resolve_ip_to_domain, target)
             data["ip_whois"] = self._get_ip_whois(target)
-            data["reverse_dns"] = self.resolve_ip_to_domain(target)
+            data["reverse_dns"] = reverse_dns.result()
         else:
             data["domain_whois"] = self._get_domain_whois(target)
         return data
 
+    def _cached_whois_data(self, target: str) -> Optional[Dict[str, Any]]:
+        """
+        Builds the get_whois_data result from the caches alone. Returns None if
+        any part of it would need a network lookup.
+        """
+        data: Dict[str, Any] = {"target": target}
+        if self._is_ip(target):
+            if _is_non_public_ip(target):
+                return self.get_whois_data(target)
+            reverse_dns = self._cached_reverse_dns(target)
+            if reverse_dns is _CACHE_MISS:
+                return None
+            ip_whois = self._cached_ip_whois(target)
+            if ip_whois is _CACHE_MISS:
+                return None
+            data["ip_whois"] = ip_whois
+            data["reverse_dns"] = reverse_dns
+        else:
+            domain_whois = self._cache_get(self._domain_whois_cache, target)
+            if domain_whois is _CACHE_MISS:
+                return None
+            data["domain_whois"] = domain_whois
+        data["lookup_timestamp"] = _utc_timestamp()
+        return data
+
+    def _forget_in_flight(self, target: str, future: Future[Dict[str, Any]]):
+        with self._cache_lock:
+            if self._whois_in_flight.get(target) is future:
+                del self._whois_in_flight[target]
+
+    def get_whois_data_within_timeout(self, target: str) -> Dict[str, Any]:
+        """
+        Answers from the caches on the calling thread when possible. Otherwise
+        runs get_whois_data on the WHOIS worker pool, shared with any request
+        already waiting on the same target, and waits at most the configured
+        timeout. A lookup that takes longer keeps running in the background
+        and fills the cache for the next request.
+        """
+        cached = self._cached_whois_data(target)
+        if cached is not None:
+            return cached
+        with self._cache_lock:
+            future = self._whois_in_flight.get(target)
+            started = future is None
+            if future is None:
+                future = self._executor.submit(self.get_whois_data, target)
+                self._whois_in_flight[target] = future
+        if started:
+            # Outside the lock: the callback runs immediately if already done
+            future.add_done_callback(lambda done: self._forget_in_flight(target, done))
+        try:
+            return future.result(timeout=self._timeout)
+        except FutureTimeoutError:
+            log.warning(
+                "WHOIS lookup for %s timed out after %ss.", target, self._timeout
+            )
+            key = "ip_whois" if self._is_ip(target) else "domain_whois"
+            return {
+                "target": target,
+                "lookup_timestamp": _utc_timestamp(),
+                "pending": True,
+                key: {"error": "WHOIS lookup timed out, please try again later."},
+            }
+
+    def _cached_reverse_dns(self, ip: str) -> Any:
+        """Returns the cached PTR name, None for a cached failure, or _CACHE_MISS."""
+        cached = self._cache_get(self._rdns_cache, ip)
+        if cached is not _CACHE_MISS:
+            return cached
+        if self._cache_get(self._rdns_negative_cache, ip) is not _CACHE_MISS:
+            return None
+        return _CACHE_MISS
+
     def resolve_ip_to_domain(self, ip: str) -> Optional[str]:
-        """Attempts to resolve an IP address to a domain name via reverse DNS."""
+        """
+        Attempts to resolve an IP address to a domain name via reverse DNS.
+        Failed lookups are cached separately with a shorter TTL so broken PTR
+        records are not retried on every request.
+        """
+        cached = self._cached_reverse_dns(ip)
+        if cached is not _CACHE_MISS:
+            return cast(Optional[str], cached)
         try:
-            domain_name, _, _ = socket.gethostbyaddr(ip)
-            log.info(f"Reverse DNS for {ip} successful: {domain_name}")
-            return domain_name
-        except (socket.herror, socket.gaierror):
-            log.debug(f"Reverse DNS for {ip} failed.")
+            answer = self._resolver.resolve_address(ip)
+        except dns.exception.DNSException as e:
+            log.debug("Reverse DNS for %s failed: %s", ip, e)
+            self._cache_set(self._rdns_negative_cache, ip, None)
             return None
+        domain_name = str(answer[0]).rstrip(".")
+        log.info("Reverse DNS for %s successful: %s", ip, domain_name)
+        self._cache_set(self._rdns_cache, ip, domain_name)
+        return domain_name
+
+    def resolve_domain_to_ip(self, domain: str) -> str:
+        """
+        Resolves a domain name to an IPv4 address, caching successful answers.
+        Raises socket.gaierror or socket.herror if it cannot be resolved.
+        """
+        cached = self._cache_get(self._forward_dns_cache, domain)
+        if cached is not _CACHE_MISS:
+            return cast(str, cached)
+        resolved_ip = socket.gethostbyname(domain)
+        self._cache_set(self._forward_dns_cache, domain, resolved_ip)
+        return resolved_ip
+
+
+# Top-level GeoIP2/GeoLite2 record keys holding a flat object with "names"
+_NAMED_RECORD_KEYS = frozenset(
+    {"city", "continent", "country", "registered_country", "represented_country"}
+)
+# Top-level record keys that never contain "names" and are passed through as-is
+_PLAIN_RECORD_KEYS = frozenset({"location", "postal", "traits"})
+# Top-level record keys exposed by the GeoLookup model; everything else
+# would be dropped by marshalling anyway, so it is not projected at all
+_RESPONSE_RECORD_KEYS = frozenset(
+    {
+        "city",
+        "continent",
+        "country",
+        "location",
+        "postal",
+        "registered_country",
+        "subdivisions",
+    }
+)
+
+
+def _select_name(names: Dict[str, Any], lang_code: str, fallback_lang: str) -> Any:
+    """Picks the name for lang_code, falling back to fallback_lang or any name."""
+    return (
+        names.get(lang_code)
+        or names.get(fallback_lang)
+        or next(iter(names.values()), None)
+    )
+
+
+def _contains_names(data: Any) -> bool:
+    """Returns True if a 'names' dictionary occurs anywhere in data."""
+    stack = [data]
+    values: Iterable[Any]
+    while stack:
+        node = stack.pop()
+        if type(node) is dict:
+            if type(node.get("names")) is dict:
+                return True
+            values = node.values()
+        elif type(node) is list:
+            values = node
+        else:
+            continue
+        for v in values:
+            if type(v) in (dict, list):
+                stack.append(v)
+    return False
 
 
 def filter_names_by_lang(
     data: Union[Dict[str, Any], List[Any]], lang_code: str, fallback_lang: str = "en"
 ) -> Union[Dict[str, Any], List[Any], Any]:
     """
-    Recursively processes a dictionary or list to replace 'names' dictionaries
-    with a single 'name' field for the specified language.
+    Processes a dictionary or list to replace 'names' dictionaries with a
+    single 'name' field for the specified language. Nested containers are
+    walked with an explicit stack instead of one recursive call per node.
+    Subtrees without any 'names' are returned as-is instead of being copied.
+    Containers are matched by exact type, as decoded records only hold plain
+    dicts and lists.
     """
-    if isinstance(data, dict):
-        if "names" in data and isinstance(data["names"], dict):
-            names = data["names"]
-            selected_name = (
-                names.get(lang_code)
-                or names.get(fallback_lang)
-                or next(iter(names.values()), None)
-            )
-            new_dict: Dict[str, Any] = {
-                k: filter_names_by_lang(v, lang_code, fallback_lang)
-                for k, v in data.items()
-                if k != "names"
-            }
-            if selected_name:
-                new_dict["name"] = selected_name
-            return new_dict
-        return {
-            k: filter_names_by_lang(v, lang_code, fallback_lang)
-            for k, v in data.items()
-        }
-    if isinstance(data, list):
-        return [filter_names_by_lang(item, lang_code, fallback_lang) for item in data]
-    return data
+    if type(data) not in (dict, list):
+        return data
+    result: Any = {} if type(data) is dict else []
+
+    # Each entry pairs a source container with the empty copy it fills
+    stack: List[Any] = [(data, result)]
+    child: Any
+    while stack:
+        source, target = stack.pop()
+        if type(source) is dict:
+            names = source.get("names")
+            if type(names) is not dict:
+                names = None
+            for k, v in source.items():
+                if k == "names" and names is not None:
+                    continue
+                if type(v) is dict and (
+                    type(v.get("names")) is dict or _contains_names(v)
+                ):
+                    target[k] = child = {}
+                    stack.append((v, child))
+                elif type(v) is list and _contains_names(v):
+                    target[k] = child = []
+                    stack.append((v, child))
+                else:
+                    target[k] = v
+            if names is not None:
+                selected_name = _select_name(names, lang_code, fallback_lang)
+                if selected_name:
+                    target["name"] = selected_name
+        else:
+            for item in source:
+                if type(item) is dict and (
+                    type(item.get("names")) is dict or _contains_names(item)
+                ):
+                    child = {}
+                elif type(item) is list and _contains_names(item):
+                    child = []
+                else:
+                    target.append(item)
+                    continue
+                target.append(child)
+                stack.append((item, child))
+    return result
+
+
+def _project_named_in_place(
+    node: Dict[str, Any], lang_code: str, fallback_lang: str
+) -> Any:
+    """Replaces 'names' with 'name' in a flat record object such as 'city'."""
+    names = node.get("names")
+    if not isinstance(names, dict) or any(
+        isinstance(v, (dict, list)) for k, v in node.items() if k != "names"
+    ):
+        # Unexpected shape, let the generic filter handle it
+        return filter_names_by_lang(node, lang_code, fallback_lang)
+    del node["names"]
+    selected_name = _select_name(names, lang_code, fallback_lang)
+    if selected_name:
+        node["name"] = selected_name
+    return node
+
+
+def project_record_in_place(
+    record: Dict[str, Any], lang_code: str, fallback_lang: str = "en"
+) -> Dict[str, Any]:
+    """
+    Produces the same result as filter_names_by_lang for a GeoIP2/GeoLite2
+    record, but handles the known top-level keys directly instead of walking
+    the whole tree, and rewrites the objects of the freshly decoded record in
+    place instead of building new ones. Unknown keys fall back to the generic
+    filter. Only use it on records nothing else holds a reference to.
+    """
+    if "names" in record:
+        return cast(
+            Dict[str, Any], filter_names_by_lang(record, lang_code, fallback_lang)
+        )
+    for key, value in record.items():
+        if key in _NAMED_RECORD_KEYS and isinstance(value, dict):
+            record[key] = _project_named_in_place(value, lang_code, fallback_lang)
+        elif key == "subdivisions" and isinstance(value, list):
+            for i, item in enumerate(value):
+                if isinstance(item, dict):
+                    value[i] = _project_named_in_place(item, lang_code, fallback_lang)
+        elif key not in _PLAIN_RECORD_KEYS:
+            record[key] = filter_names_by_lang(value, lang_code, fallback_lang)
+    return record
+
+
+# Projected records per (generation, network, lang): all addresses of a network
+# share one MMDB record, so it only needs to be filtered once
+_network_cache: LRUCache = LRUCache(maxsize=100_000)
+_network_cache_lock = threading.Lock()
+
+
+def _network_key(ip: str, prefix_len: int) -> Tuple[int, int, int]:
+    """Identifies the network of prefix_len bits that contains ip."""
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    packed = socket.inet_pton(family, ip)
+    return (
+        family,
+        prefix_len,
+        int.from_bytes(packed, "big") >> (len(packed) * 8 - prefix_len),
+    )
+
+
+@lru_cache(maxsize=100_000)
+def _cached_lookup(generation: int, ip: str, lang: str) -> Optional[Dict[str, Any]]:
+    """
+    Looks up an IP address in the active database and filters the record by
+    language. Results are cached per (reader generation, ip, lang), so a lookup
+    that races with a database swap can never be served for the new reader;
+    callers must copy the returned dictionary before modifying it.
+    """
+    record, prefix_len = db_manager.lookup(ip)
+    if not record:
+        return None
+    key = (generation, _network_key(ip, prefix_len), lang)
+    with _network_cache_lock:
+        projected = _network_cache.get(key)
+    if projected is None:
+        if isinstance(record, dict):
+            record = {k: v for k, v in record.items() if k in _RESPONSE_RECORD_KEYS}
+        else:
+            record = {}
+        # The reader decodes a new record on every lookup, so it can be
+        # projected in place
+        projected = project_record_in_place(record, lang)
+        with _network_cache_lock:
+            _network_cache[key] = projected
+    return projected
+
+
+# --- JSON Serialization ---
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+def output_json(data: Any, code: int, headers: Optional[Dict[str, str]] = None):
+    """Flask-RESTX representation that writes orjson bytes straight to the body."""
+    if code == 304:
+        response = make_response("", 304)
+        response.headers.extend(headers or {})
+        return response
+    response = make_response(
+        orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE),
+        code,
+    )
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
 
 
 # --- Global Service Instances ---
 db_manager = GeoDBManager(Config())
-whois_service = WhoisService()
+whois_service = WhoisService(Config())
 
 
 def create_app():
     """Creates and configures the Flask application."""
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     config = Config()
 
-    # Add manual CORS handler
-    @app.after_request
-    def after_request(response):
-        cors_origins = os.environ.get("GUNTER_CORS_ORIGINS")
-        if cors_origins:
-            origin = request.headers.get("Origin")
-            # Always add CORS headers when CORS is enabled
-            if cors_origins == "*":
-                response.headers["Access-Control-Allow-Origin"] = "*"
-            elif origin:
-                allowed_origins = [origin.strip() for origin in cors_origins.split(",")]
-                if origin in allowed_origins:
-                    response.headers["Access-Control-Allow-Origin"] = origin
-                    response.headers["Access-Control-Allow-Credentials"] = "true"
-
-            # Add these headers for all CORS-enabled responses
-            response.headers["Access-Control-Allow-Methods"] = (
-                "GET, POST, PUT, DELETE, OPTIONS"
-            )
-            response.headers["Access-Control-Allow-Headers"] = (
-                "Content-Type, Authorization, "
-                "Access-Control-Request-Method, "
-                "Access-Control-Request-Headers"
-            )
+    # CORS settings are parsed once here instead of on every request
+    cors_origins = os.environ.get("GUNTER_CORS_ORIGINS")
+    cors_wildcard = cors_origins == "*"
+    cors_allowed_origins = (
+        frozenset(filter(None, (o.strip() for o in cors_origins.split(","))))
+        if cors_origins and not cors_wildcard
+        else frozenset()
+    )
+
+    def add_cors_headers(response):
+        origin = request.headers.get("Origin")
+        # Always add CORS headers when CORS is enabled
+        if cors_wildcard:
+            response.headers["Access-Control-Allow-Origin"] = "*"
+        else:
+            # The allow header depends on the request's Origin, so shared
+            # caches must not serve one origin's response to another
+            response.vary.add("Origin")
+            if origin in cors_allowed_origins:
+                response.headers["Access-Control-Allow-Origin"] = origin
+                response.headers["Access-Control-Allow-Credentials"] = "true"
+
+        # Add these headers for all CORS-enabled responses
+        response.headers["Access-Control-Allow-Methods"] = (
+            "GET, POST, PUT, DELETE, OPTIONS"
+        )
+        response.headers["Access-Control-Allow-Headers"] = (
+            "Content-Type, Authorization, "
+            "Access-Control-Request-Method, "
+            "Access-Control-Request-Headers"
+        )
         return response
 
-    # Handle preflight requests
-    @app.before_request
-    def handle_preflight():
-        if request.method == "OPTIONS":
-            cors_origins = os.environ.get("GUNTER_CORS_ORIGINS")
-            if cors_origins:
-                origin = request.headers.get("Origin")
-                response = jsonify()
-                response.status_code = 200
-
-                # Always add CORS headers for OPTIONS when CORS is enabled
-                if cors_origins == "*":
-                    response.headers["Access-Control-Allow-Origin"] = "*"
-                elif origin:
-                    allowed_origins = [
-                        origin.strip() for origin in cors_origins.split(",")
-                    ]
-                    if origin in allowed_origins:
-                        response.headers["Access-Control-Allow-Origin"] = origin
-                        response.headers["Access-Control-Allow-Credentials"] = "true"
-
-                response.headers["Access-Control-Allow-Methods"] = (
-                    "GET, POST, PUT, DELETE, OPTIONS"
-                )
-                response.headers["Access-Control-Allow-Headers"] = (
-                    "Content-Type, Authorization, "
-                    "Access-Control-Request-Method, "
-                    "Access-Control-Request-Headers"
-                )
-                return response
+    if cors_origins:
+        # Add manual CORS handler
+        app.after_request(add_cors_headers)
+
+        # Handle preflight requests
+        @app.before_request
+        def handle_preflight():
+            if request.method == "OPTIONS":
+                return add_cors_headers(output_json(None, 200))
 
     # --- OpenAPI/Swagger Setup ---
     api = Api(
@@ -435,6 +1176,7 @@ def create_app():
         ),  # Disable Swagger UI if not enabled
         prefix="/api",
     )
+    api.representation("application/json")(output_json)
 
     # Define namespaces for different endpoints
     geo_ns = Namespace("geo-lookup", description="Geolocation endpoint")
@@ -477,6 +1219,9 @@ def create_app():
             "reverse_dns": fields.String(
                 description="Reverse DNS result (if available)"
             ),
+            "pending": fields.Boolean(
+                description="Set when the lookup is still running; retry later"
+            ),
         },
     )
 
@@ -501,6 +1246,63 @@ def create_app():
         },
     )
 
+    batch_request_model = api.model(
+        "BatchGeoLookupRequest",
+        {
+            "ips": fields.List(
+                fields.String,
+                required=True,
+                description=f"IP addresses to look up (at most {config.MAX_BATCH_IPS})",
+            ),
+            "lang": fields.String(
+                description="Language code for the response, overrides the query parameter"
+            ),
+        },
+    )
+
+    batch_result_model = api.clone(
+        "BatchGeoLookupResult",
+        geo_lookup_model,
+        {
+            "ip": fields.String(description="Looked up IP address"),
+            "error": fields.String(description="Error message if the lookup failed"),
+        },
+    )
+    del batch_result_model["database_info"], batch_result_model["whois_data"]
+
+    batch_response_model = api.model(
+        "BatchGeoLookup",
+        {
+            "results": fields.List(
+                fields.Nested(batch_result_model, skip_none=True),
+                description="Lookup results in request order",
+            ),
+            "database_info": fields.Raw(description="Database status information"),
+        },
+    )
+
+    # GeoLookup responses are built from these field names directly; walking
+    # the model's field objects with marshal_with on every request is costly
+    geo_lookup_keys = tuple(key for key in geo_lookup_model if key != "whois_data")
+    whois_data_keys = tuple(whois_data_model)
+
+    def marshal_geo_lookup(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Same output as marshal_with(geo_lookup_model, skip_none=True)."""
+        result = {}
+        for key in geo_lookup_keys:
+            value = data.get(key)
+            if value is not None and value != {}:
+                result[key] = value
+        whois_data = data.get("whois_data") or {}
+        result["whois_data"] = {key: whois_data.get(key) for key in whois_data_keys}
+        return result
+
+    def database_info() -> Dict[str, Any]:
+        return {
+            "last_updated_utc": db_manager.last_db_update_iso(),
+            "version_tag": db_manager.current_db_version_tag,
+        }
+
     # --- API Resources ---
     @geo_ns.route("/<string:ip>")
     @geo_ns.doc(
@@ -519,7 +1321,7 @@ def create_app():
                 "exclude_whois": "If true, WHOIS data will be excluded from the response",
             }
         )
-        @geo_ns.marshal_with(geo_lookup_model, skip_none=True, code=200)
+        @geo_ns.response(200, "Success", geo_lookup_model)
         def get(self, ip):
             if not db_manager.mmdb_reader:
                 return geo_ns.abort(
@@ -532,56 +1334,121 @@ def create_app():
             is_domain = False
 
             # Try to validate as IP address first
-            try:
-                ipaddress.ip_address(ip)
-            except ValueError:
+            if not _is_valid_ip(ip):
                 # Not a valid IP, try to resolve as domain name
                 is_domain = True
                 try:
-                    resolved_ip = socket.gethostbyname(ip)
-                    log.info(f"Resolved domain {ip} to IP {resolved_ip}")
+                    resolved_ip = whois_service.resolve_domain_to_ip(ip)
+                    log.info("Resolved domain %s to IP %s", ip, resolved_ip)
                     ip = resolved_ip
                 except (socket.gaierror, socket.herror) as e:
-                    log.error(f"Failed to resolve domain {ip}: {e}")
+                    log.error("Failed to resolve domain %s: %s", ip, e)
                     return geo_ns.abort(
                         400,
                         error=f"Invalid IP address or unable to resolve domain name: {original_input}",
                     )
 
-            record = db_manager.mmdb_reader.get(ip)
-            if not record:
-                log.info(f"IP address not found in database: {ip}")
+            lang = request.args.get("lang")
+            lang = _DEFAULT_LANG if lang is None else lang.lower()
+            exclude_whois = request.args.get("exclude_whois")
+            include_whois = (
+                exclude_whois is None or exclude_whois.lower() not in _TRUTHY
+            )
+            cached_record = _cached_lookup(db_manager.reader_generation, ip, lang)
+            if cached_record is None:
+                log.info("IP address not found in database: %s", ip)
                 return geo_ns.abort(404, error="IP address not found in the database.")
-            try:
-                lang = request.args.get("lang", config.DEFAULT_LANG).lower()
-                record_dict: Dict[str, Any] = {}
-                if record and isinstance(record, dict):
-                    for key, value in record.items():
-                        record_dict[key] = value
-                processed_record = filter_names_by_lang(record_dict, lang)
-                processed_record = cast(Dict[str, Any], processed_record)
-                processed_record["database_info"] = {
-                    "last_updated_utc": (
-                        db_manager.last_db_update_time.isoformat()
-                        if db_manager.last_db_update_time
-                        else "N/A"
-                    ),
-                    "version_tag": db_manager.current_db_version_tag,
+            db_info = database_info()
+            cache_headers: Dict[str, str] = {}
+            if not include_whois:
+                # Without WHOIS data the answer only changes with the database
+                # Hashed so a quote in the raw lang value cannot break the header
+                etag = hashlib.sha1(
+                    ":".join(
+                        (db_info["last_updated_utc"], db_info["version_tag"], ip, lang)
+                    ).encode()
+                ).hexdigest()
+                cache_headers = {
+                    "ETag": quote_etag(etag, weak=True),
+                    "Cache-Control": f"public, max-age={config.CACHE_MAX_AGE}",
                 }
-                if request.args.get("exclude_whois", "false").lower() != "true":
+                if request.if_none_match.contains_weak(etag):
+                    return {}, 304, cache_headers
+            try:
+                processed_record = dict(cached_record)
+                processed_record["database_info"] = db_info
+                if include_whois:
                     # Use original domain for WHOIS if input was a domain, otherwise use resolved IP
                     whois_target = original_input if is_domain else ip
-                    log.info(f"Including WHOIS data for: {whois_target}")
-                    processed_record["whois_data"] = whois_service.get_whois_data(
-                        whois_target
+                    log.info("Including WHOIS data for: %s", whois_target)
+                    processed_record["whois_data"] = (
+                        whois_service.get_whois_data_within_timeout(whois_target)
                     )
-                log.info(f"Lookup for IP: {ip}, Lang: {lang} successful.")
-                return processed_record
+                log.info("Lookup for IP: %s, Lang: %s successful.", ip, lang)
+                return marshal_geo_lookup(processed_record), 200, cache_headers
             except Exception as e:
-                log.error(f"Error during IP lookup for {ip}: {e}")
-                response = jsonify({"error": "An internal server error occurred."})
-                response.status_code = 500
-                return response
+                log.error("Error during IP lookup for %s: %s", ip, e)
+                return output_json({"error": "An internal server error occurred."}, 500)
+
+    @geo_ns.route("/batch")
+    @geo_ns.doc(
+        responses={
+            200: "Success",
+            400: "Invalid request body or IP address",
+            503: "GeoLite2 database not available",
+        },
+    )
+    class BatchGeoLookup(Resource):
+        @geo_ns.doc(
+            params={"lang": "Language code for the response (e.g., de, en, fr)"}
+        )
+        @geo_ns.expect(batch_request_model)
+        @geo_ns.marshal_with(batch_response_model, code=200)
+        def post(self):
+            if not db_manager.mmdb_reader:
+                return geo_ns.abort(
+                    503,
+                    error="GeoLite2 database not available. Please try again later.",
+                )
+
+            body = request.get_json(silent=True)
+            ips = body.get("ips") if isinstance(body, dict) else None
+            if not isinstance(ips, list) or not all(isinstance(ip, str) for ip in ips):
+                return geo_ns.abort(
+                    400, error="Request body must be a JSON object with an 'ips' list."
+                )
+            if len(ips) > config.MAX_BATCH_IPS:
+                return geo_ns.abort(
+                    400,
+                    error=f"At most {config.MAX_BATCH_IPS} IP addresses per request.",
+                )
+            for ip in ips:
+                if not _is_valid_ip(ip):
+                    return geo_ns.abort(400, error=f"Invalid IP address: {ip}")
+
+            lang = body.get("lang", request.args.get("lang"))
+            if lang is not None and not isinstance(lang, str):
+                return geo_ns.abort(400, error="'lang' must be a string.")
+            lang = _DEFAULT_LANG if lang is None else lang.lower()
+            generation = db_manager.reader_generation
+            # Repeated IPs share one result entry
+            entries: Dict[str, Dict[str, Any]] = {}
+            results = []
+            for ip in ips:
+                entry = entries.get(ip)
+                if entry is None:
+                    cached_record = _cached_lookup(generation, ip, lang)
+                    if cached_record is None:
+                        entry = {
+                            "ip": ip,
+                            "error": "IP address not found in the database.",
+                        }
+                    else:
+                        entry = {"ip": ip, **cached_record}
+                    entries[ip] = entry
+                results.append(entry)
+            log.info("Batch lookup for %d IPs, Lang: %s successful.", len(ips), lang)
+            return {"results": results, "database_info": database_info()}
 
     if config.ENABLE_STATUS_ENDPOINT:
 
@@ -603,29 +1470,45 @@ def create_app():
                 whois_data = whois_service.get_whois_data(target)
                 return whois_data
             except Exception as e:
-                log.error(f"Error during WHOIS lookup for {target}: {e}")
+                log.error("Error during WHOIS lookup for %s: %s", target, e)
                 whois_ns.abort(500, error="An internal server error occurred.")
 
     return app
 
 
+def start_update_scheduler(
+    update_job: Callable[[], None] = db_manager.check_for_new_release_and_update,
+) -> threading.Thread:
+    """Starts the background thread that periodically checks for database updates."""
+    interval = Config.SCHEDULER_UPDATE_DAYS * 86400
+
+    def _periodic():
+        next_run = time.monotonic() + interval
+        while True:
+            time.sleep(max(0.0, next_run - time.monotonic()))
+            next_run += interval
+            try:
+                update_job()
+            except Exception as e:
+                log.error("Scheduled database update failed: %s", e)
+
+    thread = threading.Thread(target=_periodic, name="db-update", daemon=True)
+    thread.start()
+    log.info(
+        "Scheduler started. Checking every %s day(s).", Config.SCHEDULER_UPDATE_DAYS
+    )
+    return thread
+
+
 if __name__ == "__main__":
     app = create_app()
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(
-        func=db_manager.check_for_new_release_and_update,
-        trigger="interval",
-        days=Config.SCHEDULER_UPDATE_DAYS,
-        id="daily_db_update",
-    )
     log.info("Performing initial database download on startup...")
     db_manager.download_and_load_database()
     log.info("Initial database load complete.")
-    scheduler.start()
-    log.info(
-        f"Scheduler started. Checking every {Config.SCHEDULER_UPDATE_DAYS} day(s)."
-    )
+    start_update_scheduler()
     log.info(
-        f"Starting Flask app with Waitress on http://{Config.FLASK_HOST}:{Config.FLASK_PORT}"
+        "Starting Flask app with Waitress on http://%s:%s",
+        Config.FLASK_HOST,
+        Config.FLASK_PORT,
     )
-    serve(app, host=Config.FLASK_HOST, port=Config.FLASK_PORT)
+    serve(app, host=Config.FLASK_HOST, port=Config.FLASK_PORT, threads=Config.THREADS)
@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration for running Gunter with multiple worker processes.
+
+The database is loaded once in the master process and inherited by the
+workers (preload_app), so only the master downloads databases and runs the
+update scheduler. After an update has loaded a new database file, the master
+sends itself SIGHUP and gunicorn gracefully replaces the workers with fresh
+ones forked from the updated master.
+"""
+
+import os
+import signal
+
+from app import Config, db_manager, log, start_update_scheduler
+
+wsgi_app = "app:create_app()"
+bind = f"{Config.FLASK_HOST}:{Config.FLASK_PORT}"
+workers = int(os.environ.get("GUNTER_WORKERS", os.cpu_count() or 1))
+worker_class = os.environ.get("GUNTER_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNTER_THREADS", "8"))
+# Only used by the async worker classes (gevent, eventlet)
+worker_connections = int(os.environ.get("GUNTER_WORKER_CONNECTIONS", "1000"))
+preload_app = True
+
+
+def _update_and_reload_workers():
+    loaded_db_file = db_manager.current_db_file_path
+    db_manager.check_for_new_release_and_update()
+    if db_manager.current_db_file_path != loaded_db_file:
+        log.info("Database changed, reloading workers...")
+        os.kill(os.getpid(), signal.SIGHUP)
+
+
+def when_ready(server):
+    log.info("Performing initial database download on startup...")
+    db_manager.download_and_load_database()
+    log.info("Initial database load complete.")
+    start_update_scheduler(_update_and_reload_workers)
@@ -0,0 +1,44 @@
+import socket
+
+import pytest
+import requests
+
+from tests.utils import get_mock_geo_response, get_mock_geo_response_view
+
+
+def _network_disabled(*args, **kwargs):
+    raise RuntimeError("Network access is disabled in tests; mock the call instead.")
+
+
+@pytest.fixture(autouse=True)
+def _no_network(request, monkeypatch):
+    """Fail fast on real DNS/HTTP traffic unless a test is marked external."""
+    if request.node.get_closest_marker("external"):
+        return
+    monkeypatch.setattr(socket, "socket", _network_disabled)
+    # Name resolution goes through libc rather than socket.socket
+    for name in ("getaddrinfo", "gethostbyname", "gethostbyaddr"):
+        monkeypatch.setattr(socket, name, _network_disabled)
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", _network_disabled)
+
+
+@pytest.fixture(autouse=True)
+def _bust_caches():
+    """Keep memoized helpers from carrying results between tests."""
+    yield
+    # Imported here so app.py is first loaded by the tests, after plugin setup
+    from app import _is_non_public_ip
+
+    _is_non_public_ip.cache_clear()
+
+
+@pytest.fixture(scope="session")
+def mock_geo_response():
+    """Immutable mock GeoIP response shared by the whole session."""
+    return get_mock_geo_response_view()
+
+
+@pytest.fixture
+def mutable_mock_geo_response():
+    """Fresh copy of the mock GeoIP response that a test may modify."""
+    return get_mock_geo_response()
@@ -1,145 +1,428 @@
-import json
+import functools
 import socket
+import threading
+from datetime import datetime
+from types import MappingProxyType, SimpleNamespace
 from unittest import mock
 
+import maxminddb
 import pytest
 
 # Importiere die App-Erstellungslogik, aber nicht die globale Instanz
-from app import create_app, db_manager, whois_service
+from app import (
+    _cached_lookup,
+    _network_cache,
+    create_app,
+    db_manager,
+    project_record_in_place,
+    whois_service,
+)
+
+# Canned WHOIS results; read-only so no test can change them for the next one.
+# Reader records are per-test literals or mutable_mock_geo_response copies,
+# because lookups project them in place.
+IP_WHOIS_RESPONSE = MappingProxyType(
+    {
+        "target": "8.8.8.8",
+        "lookup_timestamp": "2023-01-01T00:00:00",
+        "ip_whois": {"asn": "15169", "asn_description": "GOOGLE"},
+    }
+)
+DOMAIN_WHOIS_RESPONSE = MappingProxyType(
+    {
+        "target": "example.com",
+        "lookup_timestamp": "2023-01-01T00:00:00",
+        "domain_whois": {"domain_name": "EXAMPLE.COM"},
+    }
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_lookup_cache():
+    """Ensure cached lookups from one test never leak into the next."""
+    _cached_lookup.cache_clear()
+    _network_cache.clear()
+    whois_service._forward_dns_cache.clear()
+    yield
+    _cached_lookup.cache_clear()
+    _network_cache.clear()
+    whois_service._forward_dns_cache.clear()
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Create the Flask app once; tests reset the module state they patch."""
+    # Standardmäßig CORS deaktivieren, wenn nicht anders angegeben
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.delenv("GUNTER_CORS_ORIGINS", raising=False)
+        return create_app()
 
 
 @pytest.fixture
-def client(monkeypatch):
-    """Create a test client for the Flask app for each test."""
-    # Standardmäßig CORS deaktivieren, wenn nicht anders angegeben
-    monkeypatch.delenv("GUNTER_CORS_ORIGINS", raising=False)
-    app = create_app()
+def client(app):
+    """Create a test client for the shared Flask app for each test."""
     with app.test_client() as client:
         with app.app_context():
             yield client
 
 
+@pytest.fixture
+def mocks(monkeypatch):
+    """Replace the reader, WHOIS lookup and status report with mocks."""
+    m = SimpleNamespace(
+        reader=mock.Mock(spec=maxminddb.Reader), whois=mock.Mock(), status=mock.Mock()
+    )
+    monkeypatch.setattr(db_manager, "mmdb_reader", m.reader)
+    monkeypatch.setattr(whois_service, "get_whois_data", m.whois)
+    monkeypatch.setattr(db_manager, "get_status", m.status)
+    yield m
+
+
 class TestAPIEndpoints:
-    @mock.patch.object(db_manager, "mmdb_reader")
-    @mock.patch.object(db_manager, "last_db_update_time")
-    @mock.patch.object(db_manager, "current_db_version_tag")
-    @mock.patch.object(whois_service, "get_whois_data")
     def test_geo_lookup_success(
-        self, mock_whois_data, mock_version_tag, mock_last_update, mock_reader, client
+        self, mocks, monkeypatch, client, mutable_mock_geo_response
     ):
         """Test successful geo lookup."""
         # Setup mocks
-        from datetime import datetime
-
-        mock_version_tag.__str__ = mock.MagicMock(return_value="v1.0.0")
-        mock_last_update = datetime(2023, 1, 1, 0, 0, 0)  # A real datetime object
-        db_manager.last_db_update_time = mock_last_update
-        db_manager.current_db_version_tag = "v1.0.0"
-        mock_reader.get.return_value = {
-            "city": {"names": {"en": "Mountain View", "de": "Mountain View"}},
-            "country": {"names": {"en": "United States", "de": "Vereinigte Staaten"}},
-        }
-        mock_whois_data.return_value = {
-            "target": "8.8.8.8",
-            "lookup_timestamp": "2023-01-01T00:00:00",
-            "ip_whois": {"asn": "15169", "asn_description": "GOOGLE"},
-        }
+        monkeypatch.setattr(
+            db_manager, "last_db_update_time", datetime(2023, 1, 1, 0, 0, 0)
+        )
+        monkeypatch.setattr(db_manager, "current_db_version_tag", "v1.0.0")
+        mocks.reader.get_with_prefix_len.return_value = (mutable_mock_geo_response, 24)
+        mocks.whois.return_value = IP_WHOIS_RESPONSE
 
         # Make the request
         response = client.get("/api/geo-lookup/8.8.8.8?lang=de")
 
         # Assertions
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert "city" in data
         assert data["city"].get("name") == "Mountain View"
         assert "country" in data
         assert data["country"].get("name") == "Vereinigte Staaten"
         assert "database_info" in data
-        mock_reader.get.assert_called_once_with("8.8.8.8")
+        mocks.reader.get_with_prefix_len.assert_called_once_with("8.8.8.8")
 
-    @mock.patch.object(db_manager, "mmdb_reader", None)
-    def test_geo_lookup_no_database(self, client):
-        """Test geo lookup when database is not available."""
-        # Make the request
-        response = client.get("/api/geo-lookup/8.8.8.8")
+    @pytest.mark.parametrize("lang", ["de", "fr", "ja"])
+    def test_geo_lookup_localizes_names(
+        self, mocks, client, mock_geo_response, mutable_mock_geo_response, lang
+    ):
+        """Test every named place in the response is given in the requested language."""
+        mocks.reader.get_with_prefix_len.return_value = (mutable_mock_geo_response, 24)
+
+        response = client.get(f"/api/geo-lookup/8.8.8.8?exclude_whois=true&lang={lang}")
+
+        data = response.get_json()
+        for field in ("city", "continent", "country", "registered_country"):
+            assert data[field]["name"] == mock_geo_response[field]["names"][lang]
+        assert data["subdivisions"][0]["name"] == (
+            mock_geo_response["subdivisions"][0]["names"][lang]
+        )
+
+    def test_geo_lookup_response_matches_model(self, mocks, client):
+        """Test geo responses keep the shape marshal_with used to produce."""
+        mocks.reader.get_with_prefix_len.return_value = (
+            {"city": {"names": {"en": "Mountain View"}}, "postal": {}},
+            24,
+        )
+        mocks.whois.return_value = {
+            "target": "8.8.8.8",
+            "ip_whois": {"asn": "15169"},
+            "not_in_model": True,
+        }
 
-        # Assertions
-        assert response.status_code == 503
-        data = json.loads(response.data)
-        assert "error" in data
-        assert "database not available" in data["error"].lower()
+        data = client.get("/api/geo-lookup/8.8.8.8?lang=en").get_json()
 
-    @mock.patch.object(db_manager, "mmdb_reader")
-    def test_geo_lookup_ip_not_found(self, mock_reader, client):
-        """Test geo lookup when IP is not found in database."""
-        # Setup mock
-        mock_reader.get.return_value = None
+        assert list(data) == ["city", "database_info", "whois_data"]
+        assert data["whois_data"] == {
+            "target": "8.8.8.8",
+            "lookup_timestamp": None,
+            "ip_whois": {"asn": "15169"},
+            "domain_whois": None,
+            "reverse_dns": None,
+            "pending": None,
+        }
 
-        # Make the request
-        response = client.get("/api/geo-lookup/8.8.8.8")
+    def test_geo_lookup_marks_slow_whois_as_pending(self, mocks, monkeypatch, client):
+        """Test a slow WHOIS lookup does not hold back the geo response."""
+        monkeypatch.setattr(whois_service, "_timeout", 0.05)
+        mocks.reader.get_with_prefix_len.return_value = (
+            {"city": {"names": {"en": "Mountain View"}}},
+            24,
+        )
+        release = threading.Event()
+        mocks.whois.side_effect = lambda target: release.wait()
 
-        # Assertions
-        assert response.status_code == 404
-        data = json.loads(response.data)
-        assert "error" in data
-        assert "not found" in data["error"].lower()
+        response = client.get("/api/geo-lookup/8.8.8.8?lang=en")
+        release.set()
 
-    @mock.patch.object(db_manager, "mmdb_reader")
-    @mock.patch("app.socket.gethostbyname")
-    def test_geo_lookup_invalid_domain(self, mock_gethostbyname, mock_reader, client):
-        """Test geo lookup with invalid domain that cannot be resolved."""
-        # Mock socket.gethostbyname to raise an exception for unresolvable domain
-        mock_gethostbyname.side_effect = socket.gaierror("Name or service not known")
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["city"]["name"] == "Mountain View"
+        assert data["whois_data"]["pending"] is True
+
+    def test_geo_lookup_is_cached(self, mocks, client, mutable_mock_geo_response):
+        """Test repeated lookups for the same IP and language hit the cache."""
+        mocks.reader.get_with_prefix_len.return_value = (mutable_mock_geo_response, 24)
+        mocks.whois.return_value = {"target": "8.8.8.8"}
+
+        first = client.get("/api/geo-lookup/8.8.8.8?lang=en")
+        second = client.get("/api/geo-lookup/8.8.8.8?lang=en")
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert first.get_json() == second.get_json()
+        mocks.reader.get_with_prefix_len.assert_called_once_with("8.8.8.8")
+        # Per-request fields must not be written back into the cached record
+        assert "database_info" not in _cached_lookup(
+            db_manager.reader_generation, "8.8.8.8", "en"
+        )
+
+    def test_geo_lookup_projects_each_network_once(self, mocks, client):
+        """Test addresses in the same network share one projected record."""
+        # Like the real reader, decode a new record for every lookup
+        mocks.reader.get_with_prefix_len.side_effect = lambda ip: (
+            {"city": {"names": {"en": "Mountain View"}}},
+            24,
+        )
+
+        with mock.patch(
+            "app.project_record_in_place", wraps=project_record_in_place
+        ) as project:
+            for ip in ("8.8.8.8", "8.8.8.9", "8.8.9.8"):
+                response = client.get(f"/api/geo-lookup/{ip}?exclude_whois=true")
+                assert response.status_code == 200
+
+        # 8.8.8.8 and 8.8.8.9 are both in 8.8.8.0/24, 8.8.9.8 is not
+        assert project.call_count == 2
+        assert mocks.reader.get_with_prefix_len.call_count == 3
+
+    def test_geo_lookup_drops_fields_outside_the_model(self, mocks, client):
+        """Test record keys the API does not expose are not projected or cached."""
+        mocks.reader.get_with_prefix_len.return_value = (
+            {
+                "country": {"names": {"en": "Germany"}},
+                "traits": {"is_anycast": True},
+                "represented_country": {"names": {"en": "Germany"}},
+            },
+            24,
+        )
+
+        response = client.get("/api/geo-lookup/8.8.8.8?exclude_whois=true&lang=en")
+
+        assert response.status_code == 200
+        assert response.get_json()["country"] == {"name": "Germany"}
+        assert set(_cached_lookup(db_manager.reader_generation, "8.8.8.8", "en")) == {
+            "country"
+        }
 
-        # Make the request with invalid domain
-        response = client.get("/api/geo-lookup/invalid-domain.local")
+    def test_geo_lookup_conditional_get(self, mocks, client):
+        """Test lookups without WHOIS carry an ETag and answer If-None-Match with 304."""
+        mocks.reader.get_with_prefix_len.return_value = (
+            {"country": {"names": {"en": "Germany"}}},
+            24,
+        )
+        mocks.whois.return_value = {"target": "8.8.8.8"}
+        url = "/api/geo-lookup/8.8.8.8?exclude_whois=true&lang=en"
+
+        first = client.get(url)
+        etag = first.headers["ETag"]
+        second = client.get(url, headers={"If-None-Match": etag})
+        with_whois = client.get("/api/geo-lookup/8.8.8.8?lang=en")
+
+        assert etag.startswith('W/"')
+        assert "max-age=" in first.headers["Cache-Control"]
+        assert second.status_code == 304
+        assert second.data == b""
+        assert second.headers["ETag"] == etag
+        assert with_whois.status_code == 200
+        assert "ETag" not in with_whois.headers
+
+    def test_geo_lookup_conditional_get_quoted_lang(self, mocks, client):
+        """Test a quote in lang does not break the ETag header."""
+        mocks.reader.get_with_prefix_len.return_value = (
+            {"country": {"names": {"en": "Germany"}}},
+            24,
+        )
+
+        response = client.get("/api/geo-lookup/8.8.8.8?exclude_whois=true&lang=%22")
+
+        assert response.status_code == 200
+        assert response.headers["ETag"].startswith('W/"')
+
+    def test_geo_lookup_cache_follows_reader_swap(self, mocks, client):
+        """Test a swapped database is never answered from the old cache."""
+        mocks.reader.get_with_prefix_len.return_value = (
+            {"city": {"names": {"en": "Old"}}},
+            24,
+        )
+        new_reader = mock.Mock(spec=maxminddb.Reader)
+        new_reader.get_with_prefix_len.return_value = (
+            {"city": {"names": {"en": "New"}}},
+            24,
+        )
+        mocks.whois.return_value = {"target": "8.8.8.8"}
+
+        stale_generation = db_manager.reader_generation
+        client.get("/api/geo-lookup/8.8.8.8?lang=en")
+        db_manager._swap_reader(new_reader)
+        response = client.get("/api/geo-lookup/8.8.8.8?lang=en")
+
+        assert response.get_json()["city"]["name"] == "New"
+        assert db_manager.reader_generation == stale_generation + 1
+        mocks.reader.close.assert_called_once()
+
+    def test_batch_geo_lookup(self, mocks, client):
+        """Test batch geo lookup returns one result per IP in request order."""
+        mocks.reader.get_with_prefix_len.side_effect = lambda ip: (
+            ({"city": {"names": {"en": "Mountain View"}}}, 24)
+            if ip == "8.8.8.8"
+            else (None, 24)
+        )
+
+        response = client.post(
+            "/api/geo-lookup/batch?lang=en", json={"ips": ["8.8.8.8", "192.0.2.1"]}
+        )
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["results"] == [
+            {"ip": "8.8.8.8", "city": {"name": "Mountain View"}},
+            {"ip": "192.0.2.1", "error": "IP address not found in the database."},
+        ]
+        assert "database_info" in data
+        assert "whois_data" not in data["results"][0]
+
+    def test_batch_geo_lookup_repeated_ips(self, mocks, client):
+        """Test repeated IPs in a batch are looked up once and all answered."""
+        mocks.reader.get_with_prefix_len.return_value = (
+            {"city": {"names": {"en": "Mountain View"}}},
+            24,
+        )
+
+        response = client.post(
+            "/api/geo-lookup/batch?lang=en", json={"ips": ["8.8.8.8"] * 3}
+        )
+
+        assert response.status_code == 200
+        assert [r["ip"] for r in response.get_json()["results"]] == ["8.8.8.8"] * 3
+        mocks.reader.get_with_prefix_len.assert_called_once_with("8.8.8.8")
+
+    def test_batch_geo_lookup_lang_in_body(self, mocks, client):
+        """Test a language in the request body takes precedence over the query."""
+        mocks.reader.get_with_prefix_len.return_value = (
+            {"city": {"names": {"en": "Munich", "de": "München"}}},
+            24,
+        )
+
+        response = client.post(
+            "/api/geo-lookup/batch?lang=en", json={"ips": ["8.8.8.8"], "lang": "DE"}
+        )
+
+        assert response.get_json()["results"][0]["city"] == {"name": "München"}
+
+    @mock.patch("app.Config.MAX_BATCH_IPS", 2)
+    def test_batch_geo_lookup_limit_is_configurable(self, mocks):
+        """Test the batch size limit follows the configuration."""
+        client = create_app().test_client()
+
+        response = client.post(
+            "/api/geo-lookup/batch", json={"ips": ["8.8.8.8", "8.8.4.4", "1.1.1.1"]}
+        )
 
-        # Assertions
         assert response.status_code == 400
-        data = json.loads(response.data)
+        assert "At most 2" in response.get_json()["error"]
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            {"ips": ["8.8.8.8", "not-an-ip"]},
+            {"ips": ["8.8.8.8\x00"]},
+            {"ips": "8.8.8.8"},
+            {"ips": ["8.8.8.8"] * 101},
+            {"ips": ["8.8.8.8"], "lang": ["en"]},
+            ["8.8.8.8"],
+        ],
+    )
+    def test_batch_geo_lookup_invalid_body(self, mocks, client, body):
+        """Test batch geo lookup rejects malformed or oversized requests."""
+        response = client.post("/api/geo-lookup/batch", json=body)
+
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+        mocks.reader.get_with_prefix_len.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "target,setup,status,error",
+        [
+            (
+                "8.8.8.8",
+                lambda mocks, mp: mp.setattr(db_manager, "mmdb_reader", None),
+                503,
+                "database not available",
+            ),
+            (
+                "8.8.8.8",
+                lambda mocks, mp: setattr(
+                    mocks.reader.get_with_prefix_len, "return_value", (None, 24)
+                ),
+                404,
+                "not found",
+            ),
+            (
+                "invalid-domain.local",
+                lambda mocks, mp: mp.setattr(
+                    "app.socket.gethostbyname",
+                    mock.Mock(side_effect=socket.gaierror("Name or service not known")),
+                ),
+                400,
+                "unable to resolve",
+            ),
+        ],
+        ids=["no_database", "ip_not_found", "invalid_domain"],
+    )
+    def test_geo_lookup_errors(
+        self, mocks, monkeypatch, client, target, setup, status, error
+    ):
+        """Test geo lookup error responses and their messages."""
+        setup(mocks, monkeypatch)
+
+        response = client.get(f"/api/geo-lookup/{target}")
+
+        assert response.status_code == status
+        data = response.get_json()
         assert "error" in data
-        assert "unable to resolve" in data["error"].lower()
+        assert error in data["error"].lower()
 
-    @mock.patch.object(db_manager, "mmdb_reader")
-    @mock.patch.object(db_manager, "last_db_update_time")
-    @mock.patch.object(db_manager, "current_db_version_tag")
-    @mock.patch.object(whois_service, "get_whois_data")
     @mock.patch("app.socket.gethostbyname")
     def test_geo_lookup_with_domain(
-        self,
-        mock_gethostbyname,
-        mock_whois_data,
-        mock_version_tag,
-        mock_last_update,
-        mock_reader,
-        client,
+        self, mock_gethostbyname, mocks, monkeypatch, client
     ):
         """Test successful geo lookup with a domain name."""
-        from datetime import datetime
-
         # Setup mocks
         mock_gethostbyname.return_value = "93.184.216.34"  # example.com IP
-        mock_version_tag.__str__ = mock.MagicMock(return_value="v1.0.0")
-        mock_last_update = datetime(2023, 1, 1, 0, 0, 0)
-        db_manager.last_db_update_time = mock_last_update
-        db_manager.current_db_version_tag = "v1.0.0"
-        mock_reader.get.return_value = {
-            "city": {"names": {"en": "Norwell", "de": "Norwell"}},
-            "country": {"names": {"en": "United States", "de": "Vereinigte Staaten"}},
-        }
-        mock_whois_data.return_value = {
-            "target": "example.com",
-            "lookup_timestamp": "2023-01-01T00:00:00",
-            "domain_whois": {"domain_name": "EXAMPLE.COM"},
-        }
+        monkeypatch.setattr(
+            db_manager, "last_db_update_time", datetime(2023, 1, 1, 0, 0, 0)
+        )
+        monkeypatch.setattr(db_manager, "current_db_version_tag", "v1.0.0")
+        mocks.reader.get_with_prefix_len.return_value = (
+            {
+                "city": {"names": {"en": "Norwell", "de": "Norwell"}},
+                "country": {
+                    "names": {"en": "United States", "de": "Vereinigte Staaten"}
+                },
+            },
+            24,
+        )
+        mocks.whois.return_value = DOMAIN_WHOIS_RESPONSE
 
         # Make the request with domain name
         response = client.get("/api/geo-lookup/example.com?lang=en")
 
         # Assertions
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert "city" in data
         assert data["city"].get("name") == "Norwell"
         assert "country" in data
@@ -149,44 +432,35 @@ class TestAPIEndpoints:
         # Verify domain was resolved to IP
         mock_gethostbyname.assert_called_once_with("example.com")
         # Verify geo lookup was done on resolved IP
-        mock_reader.get.assert_called_once_with("93.184.216.34")
+        mocks.reader.get_with_prefix_len.assert_called_once_with("93.184.216.34")
         # Verify WHOIS was called with the original domain, not the IP
-        mock_whois_data.assert_called_once_with("example.com")
+        mocks.whois.assert_called_once_with("example.com")
 
-    @mock.patch.object(db_manager, "mmdb_reader")
-    @mock.patch.object(db_manager, "last_db_update_time")
-    @mock.patch.object(db_manager, "current_db_version_tag")
-    @mock.patch.object(whois_service, "get_whois_data")
     @mock.patch("app.socket.gethostbyname")
     def test_geo_lookup_domain_exclude_whois(
-        self,
-        mock_gethostbyname,
-        mock_whois_data,
-        mock_version_tag,
-        mock_last_update,
-        mock_reader,
-        client,
+        self, mock_gethostbyname, mocks, monkeypatch, client
     ):
         """Test geo lookup with domain name and exclude_whois=true."""
-        from datetime import datetime
-
         # Setup mocks
         mock_gethostbyname.return_value = "93.184.216.34"
-        mock_version_tag.__str__ = mock.MagicMock(return_value="v1.0.0")
-        mock_last_update = datetime(2023, 1, 1, 0, 0, 0)
-        db_manager.last_db_update_time = mock_last_update
-        db_manager.current_db_version_tag = "v1.0.0"
-        mock_reader.get.return_value = {
-            "city": {"names": {"en": "Norwell"}},
-            "country": {"names": {"en": "United States"}},
-        }
+        monkeypatch.setattr(
+            db_manager, "last_db_update_time", datetime(2023, 1, 1, 0, 0, 0)
+        )
+        monkeypatch.setattr(db_manager, "current_db_version_tag", "v1.0.0")
+        mocks.reader.get_with_prefix_len.return_value = (
+            {
+                "city": {"names": {"en": "Norwell"}},
+                "country": {"names": {"en": "United States"}},
+            },
+            24,
+        )
 
         # Make the request with domain name and exclude_whois
         response = client.get("/api/geo-lookup/example.com?exclude_whois=true")
 
         # Assertions
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         # The API marshaller may include the whois_data field with None values due to the model definition
         # The key check is that get_whois_data was not called
         assert "city" in data
@@ -195,47 +469,64 @@ class TestAPIEndpoints:
         # Verify domain was resolved
         mock_gethostbyname.assert_called_once_with("example.com")
         # Verify WHOIS was NOT called - this is the important check
-        mock_whois_data.assert_not_called()
+        mocks.whois.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "value,whois_called",
+        [
+            ("true", False),
+            ("TRUE", False),
+            ("1", False),
+            ("yes", False),
+            ("on", False),
+            ("false", True),
+            ("0", True),
+        ],
+    )
+    def test_geo_lookup_exclude_whois_values(
+        self, mocks, value, whois_called, client, mutable_mock_geo_response
+    ):
+        """Test which exclude_whois values turn off the WHOIS lookup."""
+        mocks.reader.get_with_prefix_len.return_value = (mutable_mock_geo_response, 24)
+        mocks.whois.return_value = {"target": "8.8.8.8"}
+
+        response = client.get(f"/api/geo-lookup/8.8.8.8?exclude_whois={value}")
 
-    @mock.patch.object(db_manager, "get_status")
-    def test_status_endpoint(self, mock_get_status, client):
+        assert response.status_code == 200
+        assert mocks.whois.called is whois_called
+
+    def test_status_endpoint(self, mocks, client):
         """Test status endpoint."""
         # Setup mock
-        mock_get_status.return_value = {
+        status = {
             "database_loaded": True,
             "last_database_update_check_utc": "2023-01-01T00:00:00",
             "current_database_version_tag": "v1.0.0",
             "current_database_file": "/data/db.mmdb",
         }
+        mocks.status.return_value = status
 
         # Make the request
         response = client.get("/api/status")
 
         # Assertions
         assert response.status_code == 200
-        data = json.loads(response.data)
-        assert data["database_loaded"] is True
-        assert data["last_database_update_check_utc"] == "2023-01-01T00:00:00"
-        assert data["current_database_version_tag"] == "v1.0.0"
-        assert data["current_database_file"] == "/data/db.mmdb"
-        mock_get_status.assert_called_once()
+        assert response.get_json().items() >= status.items()
+        mocks.status.assert_called_once()
 
     @mock.patch.object(whois_service, "get_whois_data")
     def test_whois_lookup_success(self, mock_get_whois_data, client):
         """Test successful WHOIS lookup."""
         # Setup mock
-        mock_get_whois_data.return_value = {
-            "target": "example.com",
-            "lookup_timestamp": "2023-01-01T00:00:00",
-            "domain_whois": {"domain_name": "EXAMPLE.COM"},
-        }
+        # The endpoint serializes the result as-is, so hand it a plain dict
+        mock_get_whois_data.return_value = dict(DOMAIN_WHOIS_RESPONSE)
 
         # Make the request
         response = client.get("/api/whois/example.com")
 
         # Assertions
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data["target"] == "example.com"
         assert data["domain_whois"]["domain_name"] == "EXAMPLE.COM"
         mock_get_whois_data.assert_called_once_with("example.com")
@@ -251,21 +542,33 @@ class TestAPIEndpoints:
 
         # Assertions
         assert response.status_code == 500
-        data = json.loads(response.data)
+        data = response.get_json()
         assert "error" in data
         assert "internal server error" in data["error"].lower()
         mock_get_whois_data.assert_called_once_with("example.com")
 
 
-def create_test_client_with_cors(monkeypatch, cors_origins):
-    """Factory function to create a test client with specific CORS settings."""
-    if cors_origins:
-        monkeypatch.setenv("GUNTER_CORS_ORIGINS", cors_origins)
-    else:
-        monkeypatch.delenv("GUNTER_CORS_ORIGINS", raising=False)
+@functools.lru_cache(maxsize=None)
+def _app_for(cors_origins):
+    """Create one app per distinct CORS origins setting."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        if cors_origins:
+            monkeypatch.setenv("GUNTER_CORS_ORIGINS", cors_origins)
+        else:
+            monkeypatch.delenv("GUNTER_CORS_ORIGINS", raising=False)
+        return create_app()
+
 
-    app = create_app()
-    return app.test_client()
+@pytest.fixture(scope="module", autouse=True)
+def clear_cors_apps():
+    """Drop the cached CORS apps once this module's tests are done."""
+    yield
+    _app_for.cache_clear()
+
+
+def create_test_client_with_cors(cors_origins):
+    """Factory function to create a test client with specific CORS settings."""
+    return _app_for(cors_origins).test_client()
 
 
 class TestCORSHeaders:
@@ -275,19 +578,22 @@ class TestCORSHeaders:
             (None, None),  # CORS disabled
             ("*", "*"),  # Wildcard origin
             ("https://example.com", "https://example.com"),  # Specific origin
+            # Origin listed among others
+            ("https://other.site, https://example.com", "https://example.com"),
+            ("https://other.site", None),  # Origin not listed
         ],
     )
-    @mock.patch.object(db_manager, "mmdb_reader")
-    def test_cors_headers_on_get_request(
-        self, mock_reader, cors_origins, expected_header, monkeypatch
-    ):
+    def test_cors_headers_on_get_request(self, mocks, cors_origins, expected_header):
         """Test that CORS headers are correctly set on GET requests based on env var."""
-        client = create_test_client_with_cors(monkeypatch, cors_origins)
+        client = create_test_client_with_cors(cors_origins)
 
         with client:
             # Mock the database reader to avoid 503 errors
-            mock_reader.get.return_value = {"country": {"names": {"en": "Test"}}}
-            db_manager.mmdb_reader = mock_reader
+            mocks.reader.get_with_prefix_len.return_value = (
+                {"country": {"names": {"en": "Test"}}},
+                24,
+            )
+            mocks.whois.return_value = {"target": "1.1.1.1"}
 
             # GET requests need an Origin header for the CORS logic to trigger
             headers = {"Origin": "https://example.com"}
@@ -301,6 +607,8 @@ class TestCORSHeaders:
                 )
             else:
                 assert "Access-Control-Allow-Origin" not in response.headers
+            if cors_origins and cors_origins != "*":
+                assert "Origin" in response.headers["Vary"]
 
     @pytest.mark.parametrize(
         "cors_origins,request_origin,expected_header",
@@ -315,10 +623,10 @@ class TestCORSHeaders:
         ],
     )
     def test_cors_preflight_request(
-        self, cors_origins, request_origin, expected_header, monkeypatch
+        self, cors_origins, request_origin, expected_header
     ):
         """Test OPTIONS (preflight) requests are handled correctly."""
-        client = create_test_client_with_cors(monkeypatch, cors_origins)
+        client = create_test_client_with_cors(cors_origins)
 
         with client:
             headers = {
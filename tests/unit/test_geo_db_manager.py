@@ -1,42 +1,45 @@
+import hashlib
+import io
 import os
-import tempfile
+import tarfile
+import threading
+from dataclasses import dataclass, replace
 from datetime import datetime
+from typing import Optional
 from unittest import mock
 
+import maxminddb
 import pytest
 import requests
 
-from app import GeoDBManager
-
-
-@pytest.fixture
+import app
+from app import GeoDBManager, HashingReader
+
+
+@dataclass(frozen=True)
+class DummyConfig:
+    DB_FILE_PREFIX: str = "GeoLite2-City"
+    DB_FILE_SUFFIX: str = ".mmdb"
+    DB_DOWNLOAD_URL: str = "https://example.com/GeoLite2-City.mmdb"
+    GITHUB_RELEASE_API_URL: str = (
+        "https://api.github.com/repos/example/GeoLite.mmdb/releases/latest"
+    )
+    DB_DIR: str = "/tmp"
+    DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+    EXTERNAL_DB_URL: Optional[str] = None
+    CUSTOM_DB_FILE: Optional[str] = None
+    # Neue Attribute für MaxMind-Logik
+    MAXMIND_LICENSE_KEY: Optional[str] = None
+    MAXMIND_DOWNLOAD_URL: Optional[str] = None
+    PREWARM_LOOKUPS: int = 0
+
+
+@pytest.fixture(scope="session")
 def mock_config():
-    class DummyConfig:
-        DB_FILE_PREFIX = "GeoLite2-City"
-        DB_FILE_SUFFIX = ".mmdb"
-        DB_DOWNLOAD_URL = "https://example.com/GeoLite2-City.mmdb"
-        GITHUB_RELEASE_API_URL = (
-            "https://api.github.com/repos/example/GeoLite.mmdb/releases/latest"
-        )
-        DB_DIR = "/tmp"
-        EXTERNAL_DB_URL = None
-        CUSTOM_DB_FILE = None
-        # Neue Attribute für MaxMind-Logik
-        MAXMIND_LICENSE_KEY = None
-        MAXMIND_DOWNLOAD_URL = None
-
+    """Shared immutable config; tests derive variants with dataclasses.replace."""
     return DummyConfig()
 
 
-@pytest.fixture
-def temp_dir():
-    with tempfile.TemporaryDirectory() as temp_dir:
-        old_cwd = os.getcwd()
-        os.chdir(temp_dir)
-        yield temp_dir
-        os.chdir(old_cwd)
-
-
 class TestGeoDBManager:
     def test_init(self, mock_config):
         """Test the initialization of the GeoDBManager."""
@@ -59,13 +62,13 @@ class TestGeoDBManager:
         assert status["current_database_file"] == "N/A"
 
         # Simulate custom DB file usage
-        mock_config.CUSTOM_DB_FILE = "/custom/location.mmdb"
+        mock_config = replace(mock_config, CUSTOM_DB_FILE="/custom/location.mmdb")
         manager.current_db_file_path = mock_config.CUSTOM_DB_FILE
         status = manager.get_status()
         assert status["current_database_file"] == "/custom/location.mmdb"
 
         # Set some values and test again
-        manager.mmdb_reader = mock.MagicMock()
+        manager.mmdb_reader = mock.Mock(spec=maxminddb.Reader)
         manager.last_db_update_time = datetime(2023, 1, 1)
         manager.current_db_version_tag = "v1.0.0"
         status = manager.get_status()
@@ -73,24 +76,35 @@ class TestGeoDBManager:
         assert status["last_database_update_check_utc"] == "2023-01-01T00:00:00"
         assert status["current_database_version_tag"] == "v1.0.0"
 
+    def test_http_session_retries_gateway_errors(self, mock_config):
+        """Test the shared HTTP session retries transient gateway errors."""
+        manager = GeoDBManager(mock_config)
+
+        retries = manager.http.get_adapter("https://example.com").max_retries
+        assert retries.total == 3
+        assert set(retries.status_forcelist) == {502, 503, 504}
+        assert manager.http.get_adapter("http://example.com") is (
+            manager.http.get_adapter("https://example.com")
+        )
+        assert manager.http.headers["User-Agent"] == "Gunter"
+
     @mock.patch("app.maxminddb.open_database")
-    @mock.patch("app.requests.get")
     def test_download_and_load_database_success(
-        self, mock_get, mock_open_db, mock_config, temp_dir
+        self, mock_open_db, mock_config, tmp_path, requests_mock
     ):
         """Test successful download and loading of the database (externe Quelle)."""
         # Setup mocks
-        mock_response = mock.MagicMock()
-        mock_response.headers.get.return_value = 100
-        mock_response.iter_content.return_value = [b"test data"]
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        requests_mock.get(mock_config.DB_DOWNLOAD_URL, content=b"test data")
 
-        mock_reader = mock.MagicMock()
+        mock_reader = mock.Mock(spec=maxminddb.Reader)
         mock_open_db.return_value = mock_reader
 
         # EXTERNAL_DB_URL setzen, damit der Download-Zweig getestet wird
-        mock_config.EXTERNAL_DB_URL = mock_config.DB_DOWNLOAD_URL
+        mock_config = replace(
+            mock_config,
+            EXTERNAL_DB_URL=mock_config.DB_DOWNLOAD_URL,
+            DB_DIR=str(tmp_path),
+        )
 
         # Create the manager
         manager = GeoDBManager(mock_config)
@@ -99,19 +113,135 @@ class TestGeoDBManager:
         manager.download_and_load_database()
 
         # Assertions
-        mock_get.assert_called_once_with(
-            mock_config.DB_DOWNLOAD_URL, stream=True, timeout=60
-        )
+        assert requests_mock.call_count == 1
+        assert "If-None-Match" not in requests_mock.last_request.headers
         mock_open_db.assert_called_once()
         assert manager.mmdb_reader == mock_reader
         assert manager.last_db_update_time is not None
         assert os.path.exists(manager.current_db_file_path)
 
-    @mock.patch("app.requests.get")
-    def test_download_failure(self, mock_get, mock_config, temp_dir):
+    @mock.patch("app.maxminddb.open_database")
+    def test_download_external_database_not_modified(
+        self, mock_open_db, mock_config, tmp_path, requests_mock
+    ):
+        """Test an unchanged external database is not downloaded again."""
+        requests_mock.get(
+            mock_config.DB_DOWNLOAD_URL,
+            [
+                {
+                    "content": b"test data",
+                    "headers": {
+                        "ETag": '"abc"',
+                        "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT",
+                    },
+                },
+                {"status_code": 304},
+            ],
+        )
+
+        mock_config = replace(
+            mock_config,
+            DB_DIR=str(tmp_path),
+            EXTERNAL_DB_URL=mock_config.DB_DOWNLOAD_URL,
+        )
+        manager = GeoDBManager(mock_config)
+        manager.download_and_load_database()
+        loaded_reader = manager.mmdb_reader
+        loaded_file = manager.current_db_file_path
+
+        manager.download_and_load_database()
+
+        assert requests_mock.last_request.headers["If-None-Match"] == '"abc"'
+        assert (
+            requests_mock.last_request.headers["If-Modified-Since"]
+            == "Wed, 01 Jan 2025 00:00:00 GMT"
+        )
+        mock_open_db.assert_called_once()
+        assert manager.mmdb_reader is loaded_reader
+        assert manager.current_db_file_path == loaded_file
+        assert os.listdir(tmp_path) == [os.path.basename(loaded_file)]
+
+    @mock.patch("app.maxminddb.open_database")
+    @mock.patch("app.requests.Session.get")
+    def test_download_maxmind_archive_streams_mmdb(
+        self, mock_get, mock_open_db, mock_config, tmp_path
+    ):
+        """Test the MaxMind archive is extracted directly from the response."""
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+            payload = b"mmdb data"
+            member = tarfile.TarInfo("GeoLite2-City_20250101/GeoLite2-City.mmdb")
+            member.size = len(payload)
+            tar.addfile(member, io.BytesIO(payload))
+        archive.seek(0)
+        mock_response = mock_get.return_value.__enter__.return_value
+        mock_response.raw = archive
+
+        mock_config = replace(
+            mock_config,
+            DB_DIR=str(tmp_path),
+            MAXMIND_LICENSE_KEY="key",
+            MAXMIND_DOWNLOAD_URL="https://download.example.com/db.tar.gz",
+        )
+        manager = GeoDBManager(mock_config)
+
+        manager.download_and_load_database()
+
+        mock_open_db.assert_called_once()
+        with open(manager.current_db_file_path, "rb") as f:
+            assert f.read() == b"mmdb data"
+        # Only the extracted database is kept, no archive on disk
+        assert os.listdir(tmp_path) == [os.path.basename(manager.current_db_file_path)]
+
+    @mock.patch("app.maxminddb.open_database")
+    @mock.patch("app.requests.Session.get")
+    def test_interrupted_download_leaves_no_partial_file(
+        self, mock_get, mock_open_db, mock_config, tmp_path
+    ):
+        """Test a download that fails midway never reaches its final path."""
+        mock_response = mock.MagicMock(status_code=200, headers={})
+        mock_response.raw.read.side_effect = [b"partial", OSError("connection reset")]
+        mock_get.return_value.__enter__.return_value = mock_response
+
+        mock_config = replace(
+            mock_config,
+            DB_DIR=str(tmp_path),
+            EXTERNAL_DB_URL=mock_config.DB_DOWNLOAD_URL,
+        )
+        manager = GeoDBManager(mock_config)
+        manager.download_and_load_database()
+
+        mock_open_db.assert_not_called()
+        assert manager.mmdb_reader is None
+        assert os.listdir(tmp_path) == []
+        # The streamed response is released even though the copy failed
+        mock_get.return_value.__exit__.assert_called_once()
+
+    def test_leftover_partial_downloads_are_removed(self, mock_config, tmp_path):
+        """Test '.tmp' files from an interrupted earlier run are cleaned up."""
+        for name in ("external-20240101000000.mmdb.tmp", "GeoLite2-City-1.mmdb.tmp"):
+            with open(os.path.join(tmp_path, name), "wb") as f:
+                f.write(b"partial")
+        with open(os.path.join(tmp_path, "unrelated.tmp"), "wb") as f:
+            f.write(b"keep")
+        mock_config = replace(mock_config, DB_DIR=str(tmp_path))
+
+        GeoDBManager(mock_config).download_and_load_database()
+
+        assert os.listdir(tmp_path) == ["unrelated.tmp"]
+
+    def test_download_failure(self, mock_config, tmp_path, requests_mock):
         """Test failure handling when download fails."""
         # Setup mock to raise an exception
-        mock_get.side_effect = requests.exceptions.RequestException("Network error")
+        requests_mock.get(
+            mock_config.DB_DOWNLOAD_URL,
+            exc=requests.exceptions.RequestException("Network error"),
+        )
+        mock_config = replace(
+            mock_config,
+            EXTERNAL_DB_URL=mock_config.DB_DOWNLOAD_URL,
+            DB_DIR=str(tmp_path),
+        )
 
         # Create the manager
         manager = GeoDBManager(mock_config)
@@ -120,6 +250,7 @@ class TestGeoDBManager:
         manager.download_and_load_database()
 
         # Assertions
+        assert requests_mock.called
         assert manager.mmdb_reader is None
         assert manager.current_db_file_path is None
 
@@ -157,20 +288,274 @@ class TestGeoDBManager:
         assert manager.current_db_version_tag == "v1.0.0"
         manager.download_and_load_database.assert_not_called()
 
-    def test_cleanup_old_db_files(self, mock_config, temp_dir):
+    def test_cleanup_old_db_files(self, mock_config, tmp_path):
         """Test removal of old database files."""
         # Create a test file
-        old_file = os.path.join(temp_dir, "old_db.mmdb")
-        with open(old_file, "w") as f:
-            f.write("test")
+        old_file = tmp_path / "old_db.mmdb"
+        old_file.write_text("test")
 
         # Create manager and set current file
         manager = GeoDBManager(mock_config)
-        manager.current_db_file_path = old_file
+        manager.current_db_file_path = str(old_file)
 
         # Test cleanup with new file
-        new_file = os.path.join(temp_dir, "new_db.mmdb")
-        manager._cleanup_old_db_files(new_file)
+        manager._cleanup_old_db_files(str(tmp_path / "new_db.mmdb"))
 
         # Assertion - old file should be removed
-        assert not os.path.exists(old_file)
+        assert not old_file.exists()
+
+    @mock.patch("app.maxminddb.open_database")
+    def test_activate_reader_uses_c_extension(self, mock_open_db, mock_config):
+        """Test the database is opened with the C extension reader."""
+        manager = GeoDBManager(mock_config)
+
+        manager._activate_reader("/tmp/db.mmdb")
+
+        mock_open_db.assert_called_once_with(
+            "/tmp/db.mmdb", app.maxminddb.MODE_MMAP_EXT
+        )
+        assert manager.mmdb_reader == mock_open_db.return_value
+
+    def test_prewarm_spreads_lookups_over_ipv4_space(self, mock_config):
+        """Test the prewarm scan looks up evenly spaced IPv4 addresses."""
+        mock_config = replace(mock_config, PREWARM_LOOKUPS=4)
+        manager = GeoDBManager(mock_config)
+        reader = mock.Mock(spec=maxminddb.Reader)
+        reader.get_with_prefix_len.return_value = (None, 0)
+
+        manager._prewarm(reader)
+
+        looked_up = [c.args[0] for c in reader.get_with_prefix_len.call_args_list]
+        assert looked_up == ["0.0.0.0", "64.0.0.0", "128.0.0.0", "192.0.0.0"]
+
+    @mock.patch("app.maxminddb.open_database")
+    def test_activate_reader_prewarms_before_returning(self, mock_open_db, mock_config):
+        """Test prewarm lookups run on the new reader before it is swapped in."""
+        mock_config = replace(mock_config, PREWARM_LOOKUPS=4)
+        reader = mock.Mock(spec=maxminddb.Reader)
+        reader.get_with_prefix_len.return_value = (None, 0)
+        mock_open_db.return_value = reader
+        manager = GeoDBManager(mock_config)
+
+        lookups_at_swap = []
+        with mock.patch.object(manager, "_swap_reader") as swap:
+            swap.side_effect = lambda r: lookups_at_swap.append(
+                r.get_with_prefix_len.call_count
+            )
+            manager._activate_reader("/tmp/db.mmdb")
+
+        # All lookups ran on the calling thread before the swap
+        assert lookups_at_swap == [4]
+
+    @mock.patch("app.maxminddb.open_database")
+    def test_activate_reader_falls_back_without_c_extension(
+        self, mock_open_db, mock_config
+    ):
+        """Test a missing C extension falls back to the default reader."""
+        fallback_reader = mock.Mock(spec=maxminddb.Reader)
+        mock_open_db.side_effect = [ValueError("no extension"), fallback_reader]
+        manager = GeoDBManager(mock_config)
+
+        manager._activate_reader("/tmp/db.mmdb")
+
+        assert mock_open_db.call_args_list[1] == mock.call(
+            "/tmp/db.mmdb", app.maxminddb.MODE_MMAP
+        )
+        assert manager.mmdb_reader == fallback_reader
+
+    @mock.patch("app.maxminddb.open_database")
+    def test_activate_reader_swaps_before_closing_old_reader(
+        self, mock_open_db, mock_config
+    ):
+        """Test the old reader is closed only after the new one is active."""
+        new_reader = mock_open_db.return_value
+        manager = GeoDBManager(mock_config)
+        manager.mmdb_reader = old_reader = mock.Mock(spec=maxminddb.Reader)
+        active_on_close = []
+        old_reader.close.side_effect = lambda: active_on_close.append(
+            manager.mmdb_reader
+        )
+
+        manager._activate_reader("/tmp/db.mmdb")
+
+        assert active_on_close == [new_reader]
+        new_reader.close.assert_not_called()
+
+    def test_swap_waits_for_running_lookups(self, mock_config):
+        """Test the reader is not swapped while a lookup holds the read lock."""
+        manager = GeoDBManager(mock_config)
+        manager.mmdb_reader = old_reader = mock.Mock(spec=maxminddb.Reader)
+
+        with manager._reader_lock.read():
+            swapper = threading.Thread(target=manager._swap_reader, args=(None,))
+            swapper.start()
+            swapper.join(timeout=0.1)
+            assert swapper.is_alive()
+            assert manager.mmdb_reader is old_reader
+        swapper.join(timeout=1)
+
+        assert manager.mmdb_reader is None
+        old_reader.close.assert_called_once()
+
+    @pytest.mark.skipif(
+        not hasattr(os, "posix_fadvise"), reason="posix_fadvise not available"
+    )
+    def test_advise_page_cache_preloads_database(self, mock_config, tmp_path):
+        """Test the database file is advised into the page cache."""
+        db_path = os.path.join(tmp_path, "db.mmdb")
+        with open(db_path, "wb") as f:
+            f.write(b"mmdb data")
+        manager = GeoDBManager(mock_config)
+
+        with mock.patch("app.os.posix_fadvise") as mock_fadvise:
+            manager._advise_page_cache(db_path)
+
+        advice = [c.args[3] for c in mock_fadvise.call_args_list]
+        assert advice == [os.POSIX_FADV_WILLNEED]
+
+    def test_hashing_reader_hashes_and_reports_progress(self):
+        """Test the download wrapper hashes data and advances the progress bar."""
+        progress = mock.MagicMock()
+        reader = HashingReader(io.BytesIO(b"mmdb data"), progress, 1)
+
+        assert reader.read(4) + reader.read() == b"mmdb data"
+        assert reader.sha256.hexdigest() == hashlib.sha256(b"mmdb data").hexdigest()
+        assert progress.update.call_args_list == [
+            mock.call(1, advance=4),
+            mock.call(1, advance=5),
+        ]
+
+    @mock.patch("app.maxminddb.open_database")
+    def test_activate_reader_rejects_database_failing_probe(
+        self, mock_open_db, mock_config
+    ):
+        """Test a database that fails the probe lookup never replaces the reader."""
+        new_reader = mock_open_db.return_value
+        new_reader.get.side_effect = app.maxminddb.InvalidDatabaseError("corrupt")
+        manager = GeoDBManager(mock_config)
+        manager.mmdb_reader = old_reader = mock.Mock(spec=maxminddb.Reader)
+
+        with pytest.raises(app.maxminddb.InvalidDatabaseError):
+            manager._activate_reader("/tmp/db.mmdb")
+
+        assert manager.mmdb_reader is old_reader
+        new_reader.close.assert_called_once()
+        old_reader.close.assert_not_called()
+
+    @mock.patch("app.requests.Session.get")
+    def test_failed_refresh_keeps_current_database(
+        self, mock_get, mock_config, tmp_path
+    ):
+        """Test a failed update leaves the previously loaded database active."""
+        mock_get.side_effect = requests.exceptions.RequestException("Network error")
+        mock_config = replace(
+            mock_config,
+            DB_DIR=str(tmp_path),
+            EXTERNAL_DB_URL=mock_config.DB_DOWNLOAD_URL,
+        )
+        manager = GeoDBManager(mock_config)
+        manager.mmdb_reader = old_reader = mock.Mock(spec=maxminddb.Reader)
+        manager.current_db_file_path = os.path.join(tmp_path, "current.mmdb")
+
+        manager.download_and_load_database()
+
+        assert manager.mmdb_reader is old_reader
+        assert manager.current_db_file_path == os.path.join(tmp_path, "current.mmdb")
+        old_reader.close.assert_not_called()
+
+    def test_download_and_load_database_runs_one_update_at_a_time(self, mock_config):
+        """Test update calls made while an update runs are skipped."""
+        manager = GeoDBManager(mock_config)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_update():
+            calls.append(True)
+            started.set()
+            release.wait(1)
+
+        with mock.patch.object(manager, "_download_and_load_database", slow_update):
+            first = threading.Thread(target=manager.download_and_load_database)
+            first.start()
+            started.wait(1)
+            manager.download_and_load_database()
+            release.set()
+            first.join()
+            manager.download_and_load_database()
+
+        assert len(calls) == 2
+
+    @mock.patch("app.requests.Session.head")
+    @mock.patch("app.requests.Session.get")
+    def test_maxmind_refresh_skipped_when_release_unchanged(
+        self, mock_get, mock_head, mock_config
+    ):
+        """Test an unchanged MaxMind release is detected by HEAD and not downloaded."""
+        mock_config = replace(
+            mock_config,
+            MAXMIND_LICENSE_KEY="key",
+            MAXMIND_DOWNLOAD_URL="https://download.example.com/db.tar.gz",
+        )
+        manager = GeoDBManager(mock_config)
+        manager.mmdb_reader = loaded_reader = mock.Mock(spec=maxminddb.Reader)
+        manager._maxmind_last_modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+        mock_head.return_value.headers = {
+            "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"
+        }
+
+        manager.download_and_load_database()
+
+        mock_head.assert_called_once()
+        mock_get.assert_not_called()
+        assert manager.mmdb_reader is loaded_reader
+
+    @mock.patch("app.requests.Session.head")
+    @mock.patch("app.requests.Session.get")
+    def test_maxmind_refresh_sends_if_modified_since(
+        self, mock_get, mock_head, mock_config
+    ):
+        """Test a changed release is requested conditionally and 304 keeps the reader."""
+        mock_config = replace(
+            mock_config,
+            MAXMIND_LICENSE_KEY="key",
+            MAXMIND_DOWNLOAD_URL="https://download.example.com/db.tar.gz",
+        )
+        manager = GeoDBManager(mock_config)
+        manager.mmdb_reader = loaded_reader = mock.Mock(spec=maxminddb.Reader)
+        manager._maxmind_last_modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+        mock_head.return_value.headers = {
+            "Last-Modified": "Thu, 02 Jan 2025 00:00:00 GMT"
+        }
+        mock_get.return_value.__enter__.return_value.status_code = 304
+
+        manager.download_and_load_database()
+
+        assert mock_get.call_args.kwargs["headers"] == {
+            "If-Modified-Since": "Wed, 01 Jan 2025 00:00:00 GMT"
+        }
+        assert manager.mmdb_reader is loaded_reader
+
+    def test_last_db_update_iso_follows_update_time(self, mock_config):
+        """Test the ISO update time is reformatted only when the update time changes."""
+        manager = GeoDBManager(mock_config)
+        assert manager.last_db_update_iso() == "N/A"
+
+        manager.last_db_update_time = datetime(2023, 1, 1)
+        first = manager.last_db_update_iso()
+        assert first == "2023-01-01T00:00:00"
+        assert manager.last_db_update_iso() is first
+
+        manager.last_db_update_time = datetime(2024, 1, 1)
+        assert manager.last_db_update_iso() == "2024-01-01T00:00:00"
+
+    def test_cleanup_tolerates_missing_files(self, mock_config, tmp_path):
+        """Test cleanup of files that are already gone is a silent no-op."""
+        manager = GeoDBManager(mock_config)
+        manager.current_db_file_path = os.path.join(tmp_path, "gone.mmdb")
+
+        with mock.patch.object(app.log, "error") as mock_error:
+            manager._cleanup_old_db_files(os.path.join(tmp_path, "new.mmdb"))
+            manager._cleanup_failed_download(os.path.join(tmp_path, "partial.mmdb"))
+
+        mock_error.assert_not_called()
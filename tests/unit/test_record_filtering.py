@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from app import _select_name, filter_names_by_lang, project_record_in_place
+from tests.utils import load_fixture
+
+
+def _recursive_filter(data, lang_code, fallback_lang="en"):
+    """Reference implementation of the name filter, one call per node."""
+    if isinstance(data, dict):
+        if "names" in data and isinstance(data["names"], dict):
+            selected_name = _select_name(data["names"], lang_code, fallback_lang)
+            new_dict = {
+                k: _recursive_filter(v, lang_code, fallback_lang)
+                for k, v in data.items()
+                if k != "names"
+            }
+            if selected_name:
+                new_dict["name"] = selected_name
+            return new_dict
+        return {
+            k: _recursive_filter(v, lang_code, fallback_lang) for k, v in data.items()
+        }
+    if isinstance(data, list):
+        return [_recursive_filter(item, lang_code, fallback_lang) for item in data]
+    return data
+
+
+@pytest.fixture
+def geo_record():
+    return load_fixture("geo_response_8.8.8.8.json")
+
+
+class TestRecordFiltering:
+    def test_filter_names_by_lang(self, geo_record):
+        """Test 'names' dictionaries are replaced by the requested language."""
+        result = filter_names_by_lang(geo_record, "de")
+
+        assert result["city"] == {"geoname_id": 5375480, "name": "Mountain View"}
+        assert result["country"]["name"] == "Vereinigte Staaten"
+        assert result["subdivisions"][0]["name"] == "Kalifornien"
+        assert "names" not in result["continent"]
+
+    def test_filter_names_by_lang_fallback(self, geo_record):
+        """Test unknown languages fall back to English."""
+        result = filter_names_by_lang(geo_record, "xx")
+
+        assert result["country"]["name"] == "United States"
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            {
+                "a": [{"names": {"en": "A"}}, [{"names": {"de": "B"}}, 1], None],
+                "name": "kept",
+                "names": {"en": "Outer"},
+                "b": {"names": "not a dict", "c": {"names": {}}},
+            },
+            [{"names": {"en": "X"}, "nested": [[{"names": {"en": "Y"}}]]}, "z"],
+            "scalar",
+        ],
+    )
+    def test_filter_names_by_lang_matches_recursive(self, geo_record, data):
+        """Test the iterative filter matches the recursive reference, key order included."""
+        for value in (geo_record, data):
+            assert json.dumps(filter_names_by_lang(value, "de")) == json.dumps(
+                _recursive_filter(value, "de")
+            )
+
+    def test_filter_names_by_lang_reuses_unchanged_subtrees(self, geo_record):
+        """Test subtrees without 'names' are returned as-is instead of copied."""
+        result = filter_names_by_lang(geo_record, "de")
+
+        assert result["location"] is geo_record["location"]
+        assert result["postal"] is geo_record["postal"]
+        assert result["city"] is not geo_record["city"]
+
+    def test_project_record_unknown_keys(self):
+        """Test unknown top-level keys are still filtered."""
+        record = {
+            "custom": {"nested": {"names": {"en": "Example"}}},
+            "country": {"names": {"en": "Germany"}, "extra": {"names": {}}},
+        }
+
+        expected = filter_names_by_lang(record, "en")
+
+        assert project_record_in_place(record, "en") == expected
+
+    @pytest.mark.parametrize("lang", ["de", "en", "ja", "pt-BR", "xx"])
+    def test_project_record_in_place_matches_generic_filter(self, geo_record, lang):
+        """Test projecting in place gives the same result, key order included."""
+        expected = json.dumps(filter_names_by_lang(geo_record, lang))
+        city = geo_record["city"]
+
+        result = project_record_in_place(geo_record, lang)
+
+        assert json.dumps(result) == expected
+        assert result["city"] is city
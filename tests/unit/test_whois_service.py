@@ -1,9 +1,14 @@
 import socket
+import threading
+import time
 from unittest import mock
 
+import dns.exception
+import dns.resolver
+import orjson
 import pytest
 
-from app import WhoisService
+from app import Config, WhoisService, _is_valid_ip, _utc_timestamp
 
 
 class TestWhoisService:
@@ -11,23 +16,49 @@ class TestWhoisService:
     def whois_service(self):
         return WhoisService()
 
-    def test_is_ip_valid(self, whois_service):
-        """Test IP validation with valid IPs."""
-        assert whois_service._is_ip("8.8.8.8")
-        assert whois_service._is_ip("192.168.1.1")
-        assert whois_service._is_ip("2001:0db8:85a3:0000:0000:8a2e:0370:7334")
+    @pytest.mark.parametrize(
+        "value,expected",
+        [
+            ("8.8.8.8", True),
+            ("192.168.1.1", True),
+            ("2001:0db8:85a3:0000:0000:8a2e:0370:7334", True),
+            ("example.com", False),
+            ("not-an-ip", False),
+            ("999.999.999.999", False),
+        ],
+    )
+    def test_is_ip(self, whois_service, value, expected):
+        """Test IP validation with valid and invalid values."""
+        assert whois_service._is_ip(value) is expected
 
-    def test_is_ip_invalid(self, whois_service):
-        """Test IP validation with invalid values."""
-        assert not whois_service._is_ip("example.com")
-        assert not whois_service._is_ip("not-an-ip")
-        assert not whois_service._is_ip("999.999.999.999")
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "",
+            "example.com",
+            "8.8.8.8.example.com",
+            "1.2.3",
+            "::ffff:999.1.1.1",
+            "²",
+            "8.8.8.8\x00",
+            "::1\x00",
+        ],
+    )
+    def test_is_valid_ip_rejects_non_addresses(self, value):
+        """Test the IP prefilter still rejects names and malformed addresses."""
+        assert _is_valid_ip(value) == 0
+
+    def test_is_valid_ip_returns_address_family(self):
+        """Test IP validation reports the address family."""
+        assert _is_valid_ip("8.8.8.8") == socket.AF_INET
+        assert _is_valid_ip("2001:db8::1") == socket.AF_INET6
+        assert _is_valid_ip("example.com") == 0
 
     @mock.patch("app.IPWhois")
     def test_get_ip_whois_success(self, mock_ip_whois, whois_service):
         """Test successful IP WHOIS lookup."""
         # Setup mock response
-        mock_ip_whois_instance = mock.MagicMock()
+        mock_ip_whois_instance = mock.Mock()
         mock_ip_whois_instance.lookup_rdap.return_value = {
             "asn": "15169",
             "asn_description": "GOOGLE - Google LLC",
@@ -51,7 +82,7 @@ class TestWhoisService:
     def test_get_ip_whois_exception(self, mock_ip_whois, whois_service):
         """Test exception handling in IP WHOIS lookup."""
         # Setup mock to raise an exception
-        mock_ip_whois_instance = mock.MagicMock()
+        mock_ip_whois_instance = mock.Mock()
         mock_ip_whois_instance.lookup_rdap.side_effect = Exception("Test error")
         mock_ip_whois.return_value = mock_ip_whois_instance
 
@@ -62,6 +93,46 @@ class TestWhoisService:
         assert "error" in result
         assert "Test error" in result["error"]
 
+    @mock.patch("app.IPWhois")
+    def test_get_ip_whois_is_cached(self, mock_ip_whois, whois_service):
+        """Test successful IP WHOIS results are served from the cache."""
+        mock_ip_whois.return_value.lookup_rdap.return_value = {"asn": "15169"}
+
+        first = whois_service._get_ip_whois("8.8.8.8")
+        second = whois_service._get_ip_whois("8.8.8.8")
+
+        assert first == second
+        mock_ip_whois.assert_called_once_with("8.8.8.8")
+
+    @mock.patch("app.IPWhois")
+    def test_get_ip_whois_serves_stale_while_refreshing(
+        self, mock_ip_whois, whois_service
+    ):
+        """Test an expired IP WHOIS entry is served while it is refreshed."""
+        mock_ip_whois.return_value.lookup_rdap.return_value = {"asn": "15169"}
+        stale_at = time.monotonic() - Config.WHOIS_CACHE_TTL - 1
+        whois_service._ip_whois_cache["8.8.8.8"] = (stale_at, {"asn": "old"})
+
+        result = whois_service._get_ip_whois("8.8.8.8")
+        whois_service._executor.shutdown(wait=True)
+
+        assert result == {"asn": "old"}
+        mock_ip_whois.assert_called_once_with("8.8.8.8")
+        fetched_at, data = whois_service._ip_whois_cache["8.8.8.8"]
+        assert fetched_at > stale_at
+        assert data["asn"] == "15169"
+        assert not whois_service._ip_whois_refreshing
+
+    @mock.patch("app.IPWhois")
+    def test_get_ip_whois_errors_are_not_cached(self, mock_ip_whois, whois_service):
+        """Test failed IP WHOIS lookups are retried on the next call."""
+        mock_ip_whois.return_value.lookup_rdap.side_effect = Exception("Test error")
+
+        whois_service._get_ip_whois("8.8.8.8")
+        whois_service._get_ip_whois("8.8.8.8")
+
+        assert mock_ip_whois.call_count == 2
+
     @mock.patch("app.whois.whois")
     def test_get_domain_whois_success(self, mock_whois, whois_service):
         """Test successful domain WHOIS lookup."""
@@ -89,6 +160,7 @@ class TestWhoisService:
         assert result["domain_name"] == "EXAMPLE.COM"
         assert result["registrar"] == "Test Registrar"
         assert len(result["name_servers"]) == 2
+        assert b'"creation_date":"1995-08-14T04:00:00"' in orjson.dumps(result)
 
     @mock.patch("app.whois.whois")
     def test_get_domain_whois_exception(self, mock_whois, whois_service):
@@ -103,31 +175,47 @@ class TestWhoisService:
         assert "error" in result
         assert "Test error" in result["error"]
 
-    @mock.patch("app.socket.gethostbyaddr")
-    def test_resolve_ip_to_domain_success(self, mock_gethostbyaddr, whois_service):
+    def test_resolve_ip_to_domain_success(self, whois_service):
         """Test successful reverse DNS lookup."""
         # Setup mock
-        mock_gethostbyaddr.return_value = ("example.com", [], ["8.8.8.8"])
+        with mock.patch.object(
+            whois_service._resolver, "resolve_address"
+        ) as mock_resolve_address:
+            mock_resolve_address.return_value = ["example.com."]
 
-        # Test the method
-        result = whois_service.resolve_ip_to_domain("8.8.8.8")
+            # Test the method
+            result = whois_service.resolve_ip_to_domain("8.8.8.8")
 
         # Assertions
-        mock_gethostbyaddr.assert_called_once_with("8.8.8.8")
+        mock_resolve_address.assert_called_once_with("8.8.8.8")
         assert result == "example.com"
 
-    @mock.patch("app.socket.gethostbyaddr")
-    def test_resolve_ip_to_domain_failure(self, mock_gethostbyaddr, whois_service):
+    def test_resolve_ip_to_domain_failure(self, whois_service):
         """Test failure handling in reverse DNS lookup."""
         # Setup mock to raise an exception
-        mock_gethostbyaddr.side_effect = socket.herror("Host not found")
+        with mock.patch.object(
+            whois_service._resolver, "resolve_address"
+        ) as mock_resolve_address:
+            mock_resolve_address.side_effect = dns.resolver.NXDOMAIN()
 
-        # Test the method
-        result = whois_service.resolve_ip_to_domain("8.8.8.8")
+            # Test the method
+            result = whois_service.resolve_ip_to_domain("8.8.8.8")
 
         # Assertions
         assert result is None
 
+    def test_resolve_ip_to_domain_timeout(self, whois_service):
+        """Test reverse DNS lookups give up after the configured timeout."""
+        with mock.patch.object(
+            whois_service._resolver, "resolve_address"
+        ) as mock_resolve_address:
+            mock_resolve_address.side_effect = dns.exception.Timeout()
+
+            result = whois_service.resolve_ip_to_domain("8.8.8.8")
+
+        assert result is None
+        assert whois_service._resolver.lifetime == Config.RDNS_TIMEOUT
+
     @mock.patch.object(WhoisService, "_get_ip_whois")
     @mock.patch.object(WhoisService, "_is_ip")
     @mock.patch.object(WhoisService, "resolve_ip_to_domain")
@@ -145,13 +233,51 @@ class TestWhoisService:
 
         # Assertions
         assert result["target"] == "8.8.8.8"
-        assert "lookup_timestamp" in result
+        assert result["lookup_timestamp"].endswith("+00:00")
+        assert "." not in result["lookup_timestamp"]
         assert result["ip_whois"] == {"asn": "15169"}
         assert result["reverse_dns"] == "example.com"
         mock_is_ip.assert_called_once_with("8.8.8.8")
         mock_get_ip_whois.assert_called_once_with("8.8.8.8")
         mock_resolve.assert_called_once_with("8.8.8.8")
 
+    def test_get_whois_data_runs_rdap_and_rdns_concurrently(self, whois_service):
+        """Test RDAP and reverse DNS lookups overlap instead of running serially."""
+        barrier = threading.Barrier(2, timeout=1)
+
+        def rdap(target):
+            barrier.wait()
+            return {"asn": "15169"}
+
+        def rdns(target):
+            barrier.wait()
+            return "dns.google"
+
+        with (
+            mock.patch.object(whois_service, "_get_ip_whois", side_effect=rdap),
+            mock.patch.object(whois_service, "resolve_ip_to_domain", side_effect=rdns),
+        ):
+            result = whois_service.get_whois_data("8.8.8.8")
+
+        assert result["ip_whois"] == {"asn": "15169"}
+        assert result["reverse_dns"] == "dns.google"
+
+    @pytest.mark.parametrize(
+        "ip", ["10.0.0.1", "127.0.0.1", "169.254.1.1", "224.0.0.1", "fe80::1"]
+    )
+    @mock.patch.object(WhoisService, "resolve_ip_to_domain")
+    @mock.patch.object(WhoisService, "_get_ip_whois")
+    def test_get_whois_data_skips_non_public_ips(
+        self, mock_get_ip_whois, mock_resolve, ip, whois_service
+    ):
+        """Test private and reserved IPs skip the RDAP and reverse DNS lookups."""
+        result = whois_service.get_whois_data(ip)
+
+        assert result["ip_whois"] == {"info": "private/reserved, skipped"}
+        assert result["reverse_dns"] is None
+        mock_get_ip_whois.assert_not_called()
+        mock_resolve.assert_not_called()
+
     @mock.patch.object(WhoisService, "_get_domain_whois")
     @mock.patch.object(WhoisService, "_is_ip")
     def test_get_whois_data_for_domain(
@@ -172,3 +298,122 @@ class TestWhoisService:
         assert "reverse_dns" not in result
         mock_is_ip.assert_called_once_with("example.com")
         mock_get_domain_whois.assert_called_once_with("example.com")
+
+    def test_resolve_ip_to_domain_caches_failures(self, whois_service):
+        """Test failed reverse DNS lookups are cached as None."""
+        with mock.patch.object(
+            whois_service._resolver, "resolve_address"
+        ) as mock_resolve_address:
+            mock_resolve_address.side_effect = dns.resolver.NXDOMAIN()
+
+            assert whois_service.resolve_ip_to_domain("8.8.8.8") is None
+            assert whois_service.resolve_ip_to_domain("8.8.8.8") is None
+
+        mock_resolve_address.assert_called_once_with("8.8.8.8")
+        assert "8.8.8.8" in whois_service._rdns_negative_cache
+        assert "8.8.8.8" not in whois_service._rdns_cache
+        assert whois_service._rdns_negative_cache.ttl == Config.RDNS_NEGATIVE_CACHE_TTL
+
+    @mock.patch("app.socket.gethostbyname")
+    def test_resolve_domain_to_ip_is_cached(self, mock_gethostbyname, whois_service):
+        """Test resolved domain names are served from the cache."""
+        mock_gethostbyname.return_value = "93.184.216.34"
+
+        assert whois_service.resolve_domain_to_ip("example.com") == "93.184.216.34"
+        assert whois_service.resolve_domain_to_ip("example.com") == "93.184.216.34"
+
+        mock_gethostbyname.assert_called_once_with("example.com")
+
+    @mock.patch("app.socket.gethostbyname")
+    def test_resolve_domain_to_ip_failures_are_not_cached(
+        self, mock_gethostbyname, whois_service
+    ):
+        """Test unresolvable domain names are retried on the next call."""
+        mock_gethostbyname.side_effect = socket.gaierror("Name or service not known")
+
+        for _ in range(2):
+            with pytest.raises(socket.gaierror):
+                whois_service.resolve_domain_to_ip("invalid-domain.local")
+
+        assert mock_gethostbyname.call_count == 2
+
+    def test_get_whois_data_within_timeout(self, whois_service):
+        """Test WHOIS data is returned when the lookup finishes in time."""
+        with mock.patch.object(
+            whois_service, "get_whois_data", return_value={"target": "8.8.8.8"}
+        ):
+            assert whois_service.get_whois_data_within_timeout("8.8.8.8") == {
+                "target": "8.8.8.8"
+            }
+
+    def test_get_whois_data_within_timeout_expired(self, whois_service):
+        """Test slow WHOIS lookups return an error entry instead of blocking."""
+        release = threading.Event()
+        whois_service._timeout = 0.05
+        with mock.patch.object(
+            whois_service, "get_whois_data", side_effect=lambda target: release.wait()
+        ):
+            result = whois_service.get_whois_data_within_timeout("8.8.8.8")
+        release.set()
+
+        assert result["target"] == "8.8.8.8"
+        assert "timed out" in result["ip_whois"]["error"]
+        assert result["pending"] is True
+
+    def test_get_whois_data_within_timeout_answers_cached_targets_inline(
+        self, whois_service
+    ):
+        """Test fully cached targets never queue behind slow pool tasks."""
+        whois_service._ip_whois_cache["8.8.8.8"] = (time.monotonic(), {"asn": "1"})
+        whois_service._rdns_cache["8.8.8.8"] = "dns.google"
+        whois_service._domain_whois_cache["example.com"] = {"domain_name": "X"}
+        with mock.patch.object(whois_service, "_executor") as executor:
+            ip_result = whois_service.get_whois_data_within_timeout("8.8.8.8")
+            domain_result = whois_service.get_whois_data_within_timeout("example.com")
+
+        executor.submit.assert_not_called()
+        assert ip_result["ip_whois"] == {"asn": "1"}
+        assert ip_result["reverse_dns"] == "dns.google"
+        assert domain_result["domain_whois"] == {"domain_name": "X"}
+
+    def test_get_whois_data_within_timeout_coalesces_lookups(self, whois_service):
+        """Test concurrent requests for one uncached target share a pool task."""
+        release = threading.Event()
+
+        def slow_lookup(target):
+            release.wait()
+            return {"target": target}
+
+        results = []
+        with mock.patch.object(
+            whois_service, "get_whois_data", side_effect=slow_lookup
+        ) as lookup:
+            callers = [
+                threading.Thread(
+                    target=lambda: results.append(
+                        whois_service.get_whois_data_within_timeout("8.8.8.8")
+                    )
+                )
+                for _ in range(3)
+            ]
+            for caller in callers:
+                caller.start()
+            time.sleep(0.05)
+            release.set()
+            for caller in callers:
+                caller.join()
+
+        assert lookup.call_count == 1
+        assert results == [{"target": "8.8.8.8"}] * 3
+        assert whois_service._whois_in_flight == {}
+
+    def test_utc_timestamp_is_formatted_once_per_second(self):
+        """Test timestamps within the same second reuse the formatted string."""
+        with mock.patch(
+            "app.time.time", side_effect=[1700000000.2, 1700000000.9, 1700000001.1]
+        ):
+            first, second, third = (_utc_timestamp() for _ in range(3))
+
+        assert first == "2023-11-14T22:13:20+00:00"
+        assert second is first
+        assert third == "2023-11-14T22:13:21+00:00"
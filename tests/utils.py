@@ -1,22 +1,188 @@
-import json
-import os
-from typing import Any, Dict, cast
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping
+
+import orjson
+
+_FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+
+@lru_cache(maxsize=None)
+def _read_fixture(filename: str) -> bytes:
+    return (_FIXTURES_DIR / filename).read_bytes()
 
 
 def load_fixture(filename: str) -> Dict[str, Any]:
     """
     Load a fixture file from the fixtures directory.
 
+    Each file is read once per process; every call parses a fresh copy,
+    so tests may modify the result freely.
+
     Args:
         filename: Name of the fixture file to load
 
     Returns:
         The loaded fixture as a dictionary
     """
-    fixture_path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
-    with open(fixture_path, "r") as f:
-        data = json.load(f)
-        return cast(Dict[str, Any], data)
+    return orjson.loads(_read_fixture(filename))  # type: ignore[no-any-return]
+
+
+# Built once at import; the getters below hand out copies parsed from JSON,
+# which is faster than copy.deepcopy for these nested dicts
+
+# Used for both country and registered_country; the JSON clones do not share it
+_US_COUNTRY: Dict[str, Any] = {
+    "geoname_id": 6252001,
+    "iso_code": "US",
+    "names": {
+        "de": "Vereinigte Staaten",
+        "en": "United States",
+        "es": "Estados Unidos",
+        "fr": "États-Unis",
+        "ja": "アメリカ合衆国",
+        "pt-BR": "Estados Unidos",
+        "ru": "США",
+        "zh-CN": "美国",
+    },
+}
+
+_MOCK_GEO: Dict[str, Any] = {
+    "city": {
+        "geoname_id": 5375480,
+        "names": {
+            "de": "Mountain View",
+            "en": "Mountain View",
+            "fr": "Mountain View",
+            "ja": "マウンテンビュー",
+            "ru": "Маунтин-Вью",
+        },
+    },
+    "continent": {
+        "code": "NA",
+        "geoname_id": 6255149,
+        "names": {
+            "de": "Nordamerika",
+            "en": "North America",
+            "es": "Norteamérica",
+            "fr": "Amérique du Nord",
+            "ja": "北アメリカ",
+            "pt-BR": "América do Norte",
+            "ru": "Северная Америка",
+            "zh-CN": "北美洲",
+        },
+    },
+    "country": _US_COUNTRY,
+    "location": {
+        "accuracy_radius": 1000,
+        "latitude": 37.386,
+        "longitude": -122.0838,
+        "metro_code": 807,
+        "time_zone": "America/Los_Angeles",
+    },
+    "postal": {"code": "94035"},
+    "registered_country": _US_COUNTRY,
+    "subdivisions": [
+        {
+            "geoname_id": 5332921,
+            "iso_code": "CA",
+            "names": {
+                "de": "Kalifornien",
+                "en": "California",
+                "es": "California",
+                "fr": "Californie",
+                "ja": "カリフォルニア州",
+                "pt-BR": "Califórnia",
+                "ru": "Калифорния",
+                "zh-CN": "加利福尼亚州",
+            },
+        }
+    ],
+}
+
+
+_MOCK_WHOIS_DOMAIN: Dict[str, Any] = {
+    "domain_name": "EXAMPLE.COM",
+    "registrar": "ICANN",
+    "whois_server": "whois.example-registrar.com",
+    "referral_url": "http://www.example-registrar.com",
+    "updated_date": "2022-01-01T00:00:00",
+    "creation_date": "1995-08-14T04:00:00",
+    "expiration_date": "2023-08-13T04:00:00",
+    "name_servers": ["NS1.EXAMPLE.COM", "NS2.EXAMPLE.COM"],
+    "status": [
+        "clientDeleteProhibited",
+        "clientRenewProhibited",
+        "clientTransferProhibited",
+        "serverUpdateProhibited",
+    ],
+    "emails": "domain-admin@example.com",
+    "dnssec": "unsigned",
+}
+
+
+_MOCK_WHOIS_IP: Dict[str, Any] = {
+    "asn": "15169",
+    "asn_description": "GOOGLE - Google LLC",
+    "network": {
+        "cidr": "8.8.8.0/24",
+        "name": "GOOGLE",
+        "handle": "NET-8-8-8-0-1",
+        "range": "8.8.8.0 - 8.8.8.255",
+        "start_address": "8.8.8.0",
+        "end_address": "8.8.8.255",
+        "ip_version": "v4",
+    },
+    "objects": {
+        "GOGL": {
+            "handle": "GOGL",
+            "name": "Google LLC",
+            "roles": ["registrant"],
+            "address": [
+                "1600 Amphitheatre Parkway",
+                "Mountain View",
+                "CA",
+                "94043",
+                "United States",
+            ],
+            "contact": {
+                "phone": "+1-650-253-0000",
+                "email": "dns-admin@google.com",
+            },
+        }
+    },
+}
+
+
+def _freeze(obj: Any) -> Any:
+    """Recursively wrap dicts in MappingProxyType and turn lists into tuples."""
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(item) for item in obj)
+    return obj
+
+
+_MOCK_RESPONSES: Dict[str, bytes] = {
+    "geo": orjson.dumps(_MOCK_GEO),
+    "whois_domain": orjson.dumps(_MOCK_WHOIS_DOMAIN),
+    "whois_ip": orjson.dumps(_MOCK_WHOIS_IP),
+}
+_MOCK_GEO_VIEW: Mapping[str, Any] = _freeze(_MOCK_GEO)
+
+
+def get_mock(name: str) -> Dict[str, Any]:
+    """
+    Get a fresh copy of a mock response
+
+    Args:
+        name: One of "geo", "whois_domain" or "whois_ip"
+
+    Returns:
+        The mock response as a dictionary the caller may modify
+    """
+    return orjson.loads(_MOCK_RESPONSES[name])  # type: ignore[no-any-return]
 
 
 def get_mock_geo_response() -> Dict[str, Any]:
@@ -26,85 +192,18 @@ def get_mock_geo_response() -> Dict[str, Any]:
     Returns:
         A dictionary simulating a GeoLite2 response
     """
-    result: Dict[str, Any] = {
-        "city": {
-            "geoname_id": 5375480,
-            "names": {
-                "de": "Mountain View",
-                "en": "Mountain View",
-                "fr": "Mountain View",
-                "ja": "マウンテンビュー",
-                "ru": "Маунтин-Вью",
-            },
-        },
-        "continent": {
-            "code": "NA",
-            "geoname_id": 6255149,
-            "names": {
-                "de": "Nordamerika",
-                "en": "North America",
-                "es": "Norteamérica",
-                "fr": "Amérique du Nord",
-                "ja": "北アメリカ",
-                "pt-BR": "América do Norte",
-                "ru": "Северная Америка",
-                "zh-CN": "北美洲",
-            },
-        },
-        "country": {
-            "geoname_id": 6252001,
-            "iso_code": "US",
-            "names": {
-                "de": "Vereinigte Staaten",
-                "en": "United States",
-                "es": "Estados Unidos",
-                "fr": "États-Unis",
-                "ja": "アメリカ合衆国",
-                "pt-BR": "Estados Unidos",
-                "ru": "США",
-                "zh-CN": "美国",
-            },
-        },
-        "location": {
-            "accuracy_radius": 1000,
-            "latitude": 37.386,
-            "longitude": -122.0838,
-            "metro_code": 807,
-            "time_zone": "America/Los_Angeles",
-        },
-        "postal": {"code": "94035"},
-        "registered_country": {
-            "geoname_id": 6252001,
-            "iso_code": "US",
-            "names": {
-                "de": "Vereinigte Staaten",
-                "en": "United States",
-                "es": "Estados Unidos",
-                "fr": "États-Unis",
-                "ja": "アメリカ合衆国",
-                "pt-BR": "Estados Unidos",
-                "ru": "США",
-                "zh-CN": "美国",
-            },
-        },
-        "subdivisions": [
-            {
-                "geoname_id": 5332921,
-                "iso_code": "CA",
-                "names": {
-                    "de": "Kalifornien",
-                    "en": "California",
-                    "es": "California",
-                    "fr": "Californie",
-                    "ja": "カリフォルニア州",
-                    "pt-BR": "Califórnia",
-                    "ru": "Калифорния",
-                    "zh-CN": "加利福尼亚州",
-                },
-            }
-        ],
-    }
-    return result
+    return get_mock("geo")
+
+
+def get_mock_geo_response_view() -> Mapping[str, Any]:
+    """
+    Get an immutable view of the mock GeoIP response
+
+    Returns:
+        The GeoLite2 response with nested dicts as read-only mappings and
+        lists as tuples, shared by all callers
+    """
+    return _MOCK_GEO_VIEW
 
 
 def get_mock_whois_domain_response() -> Dict[str, Any]:
@@ -114,25 +213,7 @@ def get_mock_whois_domain_response() -> Dict[str, Any]:
     Returns:
         A dictionary simulating a WHOIS response for a domain
     """
-    result: Dict[str, Any] = {
-        "domain_name": "EXAMPLE.COM",
-        "registrar": "ICANN",
-        "whois_server": "whois.example-registrar.com",
-        "referral_url": "http://www.example-registrar.com",
-        "updated_date": "2022-01-01T00:00:00",
-        "creation_date": "1995-08-14T04:00:00",
-        "expiration_date": "2023-08-13T04:00:00",
-        "name_servers": ["NS1.EXAMPLE.COM", "NS2.EXAMPLE.COM"],
-        "status": [
-            "clientDeleteProhibited",
-            "clientRenewProhibited",
-            "clientTransferProhibited",
-            "serverUpdateProhibited",
-        ],
-        "emails": "domain-admin@example.com",
-        "dnssec": "unsigned",
-    }
-    return result
+    return get_mock("whois_domain")
 
 
 def get_mock_whois_ip_response() -> Dict[str, Any]:
@@ -142,35 +223,4 @@ def get_mock_whois_ip_response() -> Dict[str, Any]:
     Returns:
         A dictionary simulating a WHOIS response for an IP
     """
-    result: Dict[str, Any] = {
-        "asn": "15169",
-        "asn_description": "GOOGLE - Google LLC",
-        "network": {
-            "cidr": "8.8.8.0/24",
-            "name": "GOOGLE",
-            "handle": "NET-8-8-8-0-1",
-            "range": "8.8.8.0 - 8.8.8.255",
-            "start_address": "8.8.8.0",
-            "end_address": "8.8.8.255",
-            "ip_version": "v4",
-        },
-        "objects": {
-            "GOGL": {
-                "handle": "GOGL",
-                "name": "Google LLC",
-                "roles": ["registrant"],
-                "address": [
-                    "1600 Amphitheatre Parkway",
-                    "Mountain View",
-                    "CA",
-                    "94043",
-                    "United States",
-                ],
-                "contact": {
-                    "phone": "+1-650-253-0000",
-                    "email": "dns-admin@google.com",
-                },
-            }
-        },
-    }
-    return result
+    return get_mock("whois_ip")